@@ -0,0 +1,103 @@
+"""
+
+    ANSI strip throughput - Measures MB/s when removing escape codes from large outputs received in 64 KB chunks,
+      comparing per-chunk 'decode()' + 'strip_ansi()' (previous behaviour) against the streaming 'AnsiStripper'. Also
+      counts escape codes leaking into the output when sequences are split across chunks.
+
+"""
+
+# Example output:
+
+# Output               Size      decode+strip_ansi  AnsiStripper  Leaked (old/new)
+# plain                20.0 MB   515.4   MB/s       1718.3  MB/s  0/0
+# coloured             20.0 MB   46.3    MB/s       53.5    MB/s  59/0
+# coloured (odd chunk) 20.0 MB   51.9    MB/s       53.9    MB/s  62/0
+
+import argparse
+import re
+import time
+
+from starlight.ssh.bin.utilities import AnsiStripper
+
+
+def old_strip_ansi(text):
+
+    # 'strip_ansi' as it was, rebuilding its regular expression on every call:
+    axtc_regex = r'\x1B(?:[@-Z\\-_][0-9];~\x07|\[[0-?]*[ -/]*[@-~])'
+    axtc_escape = re.compile(axtc_regex, flags=re.IGNORECASE)
+
+    return axtc_escape.sub('', text)
+
+
+def sample_output(size, coloured):
+
+    # Build output resembling 'show interface' / 'ls --color' output:
+    lines = []
+    length = 0
+    index = 0
+    while length < size:
+        if coloured:
+            line = (f"\x1b[1;34mGigabitEthernet1/0/{index}\x1b[0m is \x1b[32mup\x1b[0m, line protocol is up "
+                    f"(connected) \x1b[K\r\n")
+        else:
+            line = f"GigabitEthernet1/0/{index} is up, line protocol is up (connected)\r\n"
+        lines.append(line)
+        length += len(line)
+        index += 1
+
+    return ''.join(lines).encode('utf-8')
+
+
+def chunks(data, chunk_size):
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def run_old(data_chunks):
+    return ''.join(old_strip_ansi(chunk.decode('utf-8', 'ignore')) for chunk in data_chunks)
+
+
+def run_new(data_chunks):
+    stripper = AnsiStripper()
+    return ''.join(stripper.feed(chunk) for chunk in data_chunks) + stripper.flush()
+
+
+def throughput(method, data_chunks, size, repeat):
+
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = method(data_chunks)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return size / best / 1e6, result
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=float, default=20, help='Size of generated outputs (MB)')
+    parser.add_argument('--file', help='Use a captured (raw) output file instead of generated outputs')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs (best is reported)')
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, 'rb') as fh:
+            captured = fh.read()
+        samples = [(args.file, captured, 65536), (f"{args.file} (odd chunk)", captured, 65531)]
+    else:
+        size = int(args.size * 1e6)
+        samples = [
+            ('plain', sample_output(size, False), 65536),
+            ('coloured', sample_output(size, True), 65536),
+            ('coloured (odd chunk)', sample_output(size, True), 65531),
+        ]
+
+    print(f"{'Output':<20} {'Size':<9} {'decode+strip_ansi':<18} {'AnsiStripper':<13} Leaked (old/new)")
+    for name, data, chunk_size in samples:
+        data_chunks = chunks(data, chunk_size)
+        old_rate, old_text = throughput(run_old, data_chunks, len(data), args.repeat)
+        new_rate, new_text = throughput(run_new, data_chunks, len(data), args.repeat)
+        print(f"{name:<20} {len(data) / 1e6:<4.1f} MB   {old_rate:<7.1f} MB/s{'':<6} {new_rate:<7.1f} MB/s  "
+              f"{old_text.count(chr(27))}/{new_text.count(chr(27))}")
@@ -0,0 +1,105 @@
+"""
+
+    Async vs threaded - Runs the same tasks against the local mock SSH server with the threaded 'interaction()' and the
+      asyncio 'interaction()', comparing throughput, peak memory (RSS) and peak thread count. Each engine runs in its own
+      process so memory figures are not shared.
+
+"""
+
+# Example output:
+
+# Tasks: 200, concurrency: 50, commands per task: 2
+# Engine     Time (s)  Tasks/s   RSS (MB)   Peak threads
+# threaded   1.52      132.0     53.4       146
+# async      1.48      135.5     53.3       119
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+
+def run_engine(engine, port, tasks, concurrency):
+
+    from starlight.ssh.bin import interaction as threaded
+    from starlight.ssh.bin import async_interaction
+    from starlight.ssh.bin.session import SessionManager
+
+    logging.getLogger('starlight').setLevel(logging.WARNING)
+
+    task_list = [{
+        'host': '127.0.0.1',
+        'port': port,
+        'authentication': {'username': 'user', 'password': 'password'},
+        'command_list': ['date', 'cat /etc/os-release'],
+        'transcript': 'off',
+    } for _ in range(tasks)]
+
+    # Sample the number of threads while running:
+    peak_threads = [threading.active_count()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.05):
+            peak_threads.append(threading.active_count())
+
+    threading.Thread(target=sample, daemon=True).start()
+
+    start = time.perf_counter()
+    if engine == 'threaded':
+        threaded.dsm = SessionManager(max_sessions=concurrency)
+        results = threaded.interaction(task_list)
+    else:
+        results = asyncio.run(async_interaction.interaction(task_list, max_sessions=concurrency))
+    elapsed = time.perf_counter() - start
+    done.set()
+
+    return {
+        'engine': engine,
+        'time': elapsed,
+        'tasks_per_second': tasks / elapsed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'peak_threads': max(peak_threads),
+        'failed': sum(1 for task in results if task.get('status') == 'error'),
+    }
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=200, help='Number of tasks')
+    parser.add_argument('--concurrency', type=int, default=50, help='Maximum number of concurrent sessions')
+    parser.add_argument('--port', type=int, default=2222, help='Port used for the mock SSH server')
+    parser.add_argument('--engine', choices=['threaded', 'async'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.engine:
+        print(json.dumps(run_engine(args.engine, args.port, args.tasks, args.concurrency)))
+        sys.exit(0)
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_server.py'),
+         '--port', str(args.port)])
+    time.sleep(2)
+
+    try:
+        print(f"Tasks: {args.tasks}, concurrency: {args.concurrency}, commands per task: 2")
+        print(f"{'Engine':<10} {'Time (s)':<9} {'Tasks/s':<9} {'RSS (MB)':<10} Peak threads")
+        for engine in ['threaded', 'async']:
+            run = subprocess.run(
+                [sys.executable, __file__, '--engine', engine, '--port', str(args.port), '--tasks', str(args.tasks),
+                 '--concurrency', str(args.concurrency)], capture_output=True, text=True)
+            result = json.loads(run.stdout.strip().split('\n')[-1])
+            failed = f" ({result['failed']} failed)" if result['failed'] else ''
+            print(f"{engine:<10} {result['time']:<9.2f} {result['tasks_per_second']:<9.1f} "
+                  f"{result['peak_rss_mb']:<10.1f} {result['peak_threads']}{failed}")
+    finally:
+        server.terminate()
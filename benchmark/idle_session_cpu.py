@@ -0,0 +1,125 @@
+"""
+
+    Idle session CPU - Compares CPU used per idle SSH session when busy-polling 'recv_ready()' against blocking on the
+      channel's file descriptor with 'wait_for_data()'.
+
+"""
+
+# Example output:
+
+# Idle sessions: 20, duration: 2.0s
+# busy-poll:  CPU per idle session: 4.89%, wake-up latency: 0.058ms
+# wait:       CPU per idle session: 0.01%, wake-up latency: 0.116ms
+
+import argparse
+import os
+import threading
+import time
+
+from starlight.ssh.bin.utilities import wait_for_data
+
+
+class IdleChannel:
+
+    """
+        Stand-in for a paramiko channel connected to a device that has not sent anything yet.
+    """
+
+    def __init__(self):
+        self._read_fd, self._write_fd = os.pipe()
+        self._ready = False
+        self.closed = False
+        self.eof_received = False
+
+    def fileno(self):
+        return self._read_fd
+
+    def recv_ready(self):
+        return self._ready
+
+    def feed(self):
+        self._ready = True
+        os.write(self._write_fd, b'x')
+
+    def close(self):
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+
+
+def busy_poll(channel, deadline):
+
+    # Previous 'send_command' receive loop (no sleep between polls):
+    while time.time() < deadline:
+        if channel.recv_ready():
+            return time.perf_counter()
+        if channel.closed:
+            return None
+    return None
+
+
+def readiness_wait(channel, deadline):
+
+    # Current receive loop:
+    while time.time() < deadline:
+        if wait_for_data(channel, deadline - time.time()):
+            if channel.recv_ready():
+                return time.perf_counter()
+            if channel.closed:
+                return None
+    return None
+
+
+def idle_cpu(method, sessions, duration):
+
+    channels = [IdleChannel() for _ in range(sessions)]
+    deadline = time.time() + duration
+    threads = [threading.Thread(target=method, args=(channel, deadline)) for channel in channels]
+
+    cpu_start = time.process_time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cpu_used = time.process_time() - cpu_start
+
+    for channel in channels:
+        channel.close()
+
+    return 100 * cpu_used / (sessions * duration)
+
+
+def wake_latency(method, samples=50):
+
+    latencies = []
+    for _ in range(samples):
+        channel = IdleChannel()
+        result = {}
+
+        def waiter():
+            result['woke'] = method(channel, time.time() + 5)
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.005)
+        sent = time.perf_counter()
+        channel.feed()
+        thread.join()
+        latencies.append(result['woke'] - sent)
+        channel.close()
+
+    latencies.sort()
+    return 1000 * latencies[len(latencies) // 2]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=50, help='Number of idle sessions (threads)')
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds each session stays idle')
+    args = parser.parse_args()
+
+    print(f"Idle sessions: {args.sessions}, duration: {args.duration}s")
+    for name, method in (('busy-poll', busy_poll), ('wait', readiness_wait)):
+        cpu = idle_cpu(method, args.sessions, args.duration)
+        latency = wake_latency(method)
+        print(f"{name + ':':<11} CPU per idle session: {cpu:.2f}%, wake-up latency: {latency:.3f}ms")
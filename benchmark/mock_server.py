@@ -0,0 +1,432 @@
+"""
+
+    Mock SSH server - Local SSH server (paramiko) emulating network devices and hosts, used to test and benchmark
+      starlight without real devices. Any username is accepted with the configured password.
+
+    Vendors ('--vendor') have the prompts, error messages, paging prompts and paging commands starlight knows (see
+      'SSH_PROMPTS' in 'identify.py'): 'linux', 'cisco', 'aruba' and 'f5'. Canned outputs are read from files, one per
+      command (named after the command, spaces replaced by '_'), in 'outputs/<vendor>' (see '--outputs').
+
+    The server can act as a jump-host: 'direct-tcpip' channels are served by an emulated device of the same kind over
+      the channel (so thousands of devices can be reached via one port), or forwarded to the real destination (see
+      '--forward').
+
+    Faults can be injected to test how starlight copes: latency (of the login and of each command), limited bandwidth,
+      paging, authentication failures and a limit on the number of channels forwarded at once.
+
+    Usage: python benchmark/mock_server.py --port 2222 [--ports 100] [--vendor cisco] [--latency 0.05] ...
+
+"""
+
+import argparse
+import logging
+import os
+import random
+import select
+import shlex
+import socket
+import threading
+import time
+
+import paramiko
+
+
+class MockServer(paramiko.ServerInterface):
+
+    """
+        Handles authentication and channel requests for one client connection.
+    """
+
+    def __init__(self, device):
+        self.device = device                           # MockDevice (settings of the device emulated)
+        self.forwards = {}                             # 'direct-tcpip' channels requested: channel id -> destination
+        self.lock = threading.Lock()
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        time.sleep(self.device.login_latency)
+        if password == self.device.password and random.random() >= self.device.auth_failure_rate:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+
+        # Jump-host: refuse channels beyond the limit, as sshd 'MaxSessions' would:
+        with self.device.lock:
+            if self.device.max_forwards is not None and self.device.forwards >= self.device.max_forwards:
+                return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+            self.device.forwards += 1
+        with self.lock:
+            self.forwards[chanid] = destination
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        threading.Thread(target=shell, args=(channel, self.device), daemon=True).start()
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=run_exec, args=(channel, command.decode('utf-8', 'ignore'), self.device),
+                         daemon=True).start()
+        return True
+
+
+class MockDevice:
+
+    """
+        Settings of the device emulated (shared by all of its connections).
+    """
+
+    def __init__(
+            self, vendor: str = 'linux', password: str = 'password', outputs: dict = None, latency: float = 0,
+            login_latency: float = 0, bandwidth: int = None, page_lines: int = None, auth_failure_rate: float = 0,
+            max_forwards: int = None, forward: bool = False):
+
+        self.vendor = vendor                           # Vendor emulated (see 'VENDORS')
+        self.profile = VENDORS[vendor]                 # Prompt, messages and paging settings of the vendor
+        self.password = password                       # Password accepted (any username)
+        self.outputs = outputs if outputs is not None else load_outputs(vendor)
+        self.latency = latency                         # Delay before responding to each command (seconds)
+        self.login_latency = login_latency             # Delay before responding to each login attempt (seconds)
+        self.bandwidth = bandwidth                     # Maximum output rate (bytes per second), None for no limit
+        self.page_lines = page_lines                   # Lines per page until paging is disabled, None for no paging
+        self.auth_failure_rate = auth_failure_rate     # Share of login attempts failing at random (0 to 1)
+        self.max_forwards = max_forwards               # Maximum number of channels forwarded at once (jump-host)
+        self.forward = forward                         # Forward channels to the real destination, not an emulation
+        self.forwards = 0                              # Channels forwarded (open)
+        self.lock = threading.Lock()                   # Guards 'forwards'
+
+
+def shell(channel, device):
+
+    # Emulate an interactive shell: echo each line, send the canned output of its commands and the prompt:
+    profile = device.profile
+    paging = device.page_lines is not None
+    channel.sendall(f"{profile['banner']}\r\n{profile['prompt']}".encode('utf-8'))
+    received = b''
+    connected = True
+    while connected:
+        data = channel.recv(1024)
+        if not data:
+            break
+        received += data
+        while connected and b'\n' in received:
+            line, received = received.split(b'\n', 1)
+            command = line.decode('utf-8', 'ignore').strip('\r')
+            if command in ['exit', 'quit', 'logout']:
+                connected = False
+                continue
+            if command == profile['disable_paging']:
+                paging = False
+
+            if device.latency > 0:
+                time.sleep(device.latency)
+
+            response = shell_output(command, device)
+
+            send(channel, f"{command}\r\n".encode('utf-8'), device)
+            if paging and response.count('\r\n') > device.page_lines:
+                if not send_pages(channel, response, device):
+                    connected = False
+                    continue
+            else:
+                send(channel, response.encode('utf-8'), device)
+            send(channel, profile['prompt'].encode('utf-8'), device)
+
+    try:
+        channel.close()
+    except EOFError:
+        pass                                           # Client already dropped the connection
+
+
+def send_pages(channel, response, device):
+
+    # Send output a page at a time, waiting for the reply to the paging prompt after each page (False if lost):
+    lines = response.split('\r\n')[:-1]
+    more = device.profile['more'].encode('utf-8')
+    for start in range(0, len(lines), device.page_lines):
+        page = lines[start:start + device.page_lines]
+        send(channel, ''.join(f"{line}\r\n" for line in page).encode('utf-8'), device)
+        if start + device.page_lines >= len(lines):
+            break
+        channel.sendall(more)
+        reply = channel.recv(1)
+        if not reply:
+            return False
+        channel.sendall(b'\x08' * len(more) + b' ' * len(more) + b'\x08' * len(more))
+        if reply in [b'q', b'Q']:
+            break
+    return True
+
+
+def send(channel, data, device):
+
+    # Send data, no faster than the bandwidth allowed:
+    if device.bandwidth is None:
+        channel.sendall(data)
+        return
+    chunk = max(device.bandwidth // 10, 1)
+    for start in range(0, len(data), chunk):
+        channel.sendall(data[start:start + chunk])
+        time.sleep(len(data[start:start + chunk]) / device.bandwidth)
+
+
+def shell_output(command, device):
+
+    # Output of a command line. Shells run ';' separated commands (e.g.: batched commands and their markers) one after
+    #   the other, and support 'echo' and 'eval':
+    profile = device.profile
+    command = command.strip()
+    if profile['separator']:
+        parts = [''.join(part) for part in split_commands(command)]
+        if len(parts) > 1:
+            return ''.join(shell_output(part, device) for part in parts)
+        if command.startswith('eval '):
+            return shell_output(' '.join(shlex.split(command)[1:]), device)
+    if command == '' or command.startswith('!') or command == profile['disable_paging']:
+        return ''
+    if command in device.outputs:
+        return device.outputs[command].replace('\n', '\r\n') + '\r\n'
+    if profile['separator'] and command.split()[0] == 'echo':
+        return ' '.join(shlex.split(command)[1:]) + '\r\n'
+    return profile['error'].format(command=command, name=command.split()[0]).replace('\n', '\r\n') + '\r\n'
+
+
+def split_commands(command):
+
+    # Split a command line on ';' (not within quotes):
+    parts = [[]]
+    quote = None
+    for char in command:
+        if char == ';' and quote is None:
+            parts.append([])
+            continue
+        if char in ['"', "'"]:
+            quote = None if quote == char else quote or char
+        parts[-1].append(char)
+    return parts
+
+
+def run_exec(channel, command, device):
+
+    # Exec channel: send the output of the command and its exit status:
+    if device.latency > 0:
+        time.sleep(device.latency)
+    wait_for_eof(channel)
+    exit_status = 0 if command in device.outputs or command.split()[:1] == ['echo'] else 127
+    try:
+        if command in device.outputs:
+            send(channel, (device.outputs[command] + '\n').encode('utf-8'), device)
+        elif exit_status == 0:
+            send(channel, (' '.join(shlex.split(command)[1:]) + '\n').encode('utf-8'), device)
+        else:
+            channel.sendall_stderr(f"sh: {command.split()[0] if command else ''}: command not found\n".encode())
+        channel.send_exit_status(exit_status)
+        channel.close()
+    except (EOFError, OSError):
+        pass
+
+
+def wait_for_eof(channel, timeout=1):
+
+    # Wait (briefly) for the client to end its input: it has the reply to its exec request by then, so closing the
+    #   channel can't overtake the reply:
+    channel.settimeout(timeout)
+    try:
+        while channel.recv(1024):
+            pass
+    except (socket.timeout, EOFError, OSError):
+        pass
+    channel.settimeout(None)
+
+
+def forward(channel, destination):
+
+    # Jump-host: relay a 'direct-tcpip' channel to its real destination:
+    try:
+        sock = socket.create_connection(destination, timeout=10)
+    except OSError:
+        channel.close()
+        return
+    try:
+        while True:
+            readable, _, _ = select.select([channel, sock], [], [])
+            if channel in readable:
+                data = channel.recv(65536)
+                if not data:
+                    break
+                sock.sendall(data)
+            if sock in readable:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                channel.sendall(data)
+    except (EOFError, OSError):
+        pass
+    finally:
+        sock.close()
+        channel.close()
+
+
+def handle(client, host_key, device):
+
+    # Run the SSH protocol for one client connection (a socket, or a channel forwarded by a jump-host):
+    transport = paramiko.Transport(client)
+    transport.add_server_key(host_key)
+    server = MockServer(device)
+    try:
+        transport.start_server(server=server)
+    except (paramiko.SSHException, EOFError, OSError):
+        return
+    while transport.is_active():
+        channel = transport.accept(1)
+        if channel is None:
+            continue
+
+        # Session channels are served once a shell or command is requested (see 'MockServer'), forwarded ones here:
+        with server.lock:
+            destination = server.forwards.pop(channel.get_id(), None)
+        if destination is not None:
+            threading.Thread(target=relay, args=(channel, destination, host_key, device), daemon=True).start()
+
+
+def relay(channel, destination, host_key, device):
+
+    # Serve a forwarded channel (emulated device, or real destination), then free its place on the jump-host:
+    try:
+        if device.forward:
+            forward(channel, destination)
+        else:
+            handle(channel, host_key, device)
+    finally:
+        with device.lock:
+            device.forwards -= 1
+
+
+def serve(port, host='127.0.0.1', device: MockDevice = None, ports: int = 1, ready=None):
+
+    """
+        Listens for SSH connections until interrupted.
+    :param port: TCP port to listen on (the first, if listening on several)
+    :param host: Address to listen on
+    :param device: MockDevice (settings of the device emulated), defaults to a Linux host
+    :param ports: Number of consecutive ports to listen on (one device on each)
+    :param ready: threading.Event set once listening
+    """
+
+    if device is None:
+        device = MockDevice()
+
+    # Clients dropping connections are expected, don't report them:
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+    host_key = paramiko.RSAKey.generate(2048)
+
+    listeners = []
+    for index in range(ports):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((host, port + index))
+        listener.listen(1024)
+        listeners.append(listener)
+    if ready is not None:
+        ready.set()
+
+    while True:
+        readable, _, _ = select.select(listeners, [], [])
+        for listener in readable:
+            client, _ = listener.accept()
+            threading.Thread(target=handle, args=(client, host_key, device), daemon=True).start()
+
+
+def load_outputs(vendor, path=None):
+
+    # Canned outputs: one file per command in 'outputs/<vendor>' (file named after the command, spaces as '_'):
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'outputs', vendor)
+    outputs = dict(DEFAULT_OUTPUTS.get(vendor, {}))
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.txt'):
+                with open(os.path.join(path, name), encoding='utf-8') as f:
+                    outputs[name[:-4].replace('_', ' ')] = f.read().rstrip('\n')
+    return outputs
+
+
+# Vendors emulated: prompt, login banner, error for unknown commands, paging prompt, command disabling paging and
+#   whether several commands can be sent on one line (';' separator):
+VENDORS = {
+    'linux': {
+        'prompt': 'user@mock:~$ ',
+        'banner': 'Welcome to the mock server',
+        'error': 'bash: {name}: command not found',
+        'more': 'lines 1-20 ',
+        'disable_paging': 'export PAGER=cat SYSTEMD_PAGER=cat',
+        'separator': True,
+    },
+    'cisco': {
+        'prompt': 'mock-router#',
+        'banner': '\r\nUser Access Verification\r\n',
+        'error': "  ^\n% Invalid input detected at '^' marker.",
+        'more': ' --More-- ',
+        'disable_paging': 'terminal length 0',
+        'separator': False,
+    },
+    'aruba': {
+        'prompt': '(mock-controller) *#',
+        'banner': '',
+        'error': "  ^\n% Invalid input detected at '^' marker.",
+        'more': '--More-- (q) quit (u) pageup (/) search (n) repeat ',
+        'disable_paging': 'no paging',
+        'separator': False,
+    },
+    'f5': {
+        'prompt': 'admin@(mock-f5)(cfg-sync Standalone)(Active)(/Common)(tmos)# ',
+        'banner': 'Last login: Sun Oct 26 18:43:53 2025',
+        'error': 'Syntax Error: "{name}" unknown command',
+        'more': '---(less 42%)---',
+        'disable_paging': 'modify cli preference pager disabled',
+        'separator': False,
+    },
+}
+
+# Outputs of commands used by starlight (e.g.: to identify hosts), also used when there is no output file:
+DEFAULT_OUTPUTS = {
+    'linux': {
+        'date': 'Sun Oct 26 18:43:53 GMT 2025',
+        'cat /etc/os-release': 'PRETTY_NAME="Ubuntu 24.04.3 LTS"\nNAME="Ubuntu"\nVERSION_ID="24.04"\nID=ubuntu',
+        'uptime': ' 18:43:53 up 12 days,  3:02,  1 user,  load average: 0.00, 0.01, 0.05',
+        'echo $SHELL': '/bin/bash',
+    },
+}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=2222, help='TCP port to listen on')
+    parser.add_argument('--ports', type=int, default=1, help='Number of consecutive ports to listen on')
+    parser.add_argument('--password', default='password', help='Password accepted (any username)')
+    parser.add_argument('--vendor', default='linux', choices=sorted(VENDORS), help='Vendor emulated')
+    parser.add_argument('--outputs', help="Directory of canned outputs (default: 'outputs/<vendor>')")
+    parser.add_argument('--latency', type=float, default=0, help='Delay before responding to each command (s)')
+    parser.add_argument('--login-latency', type=float, default=0, help='Delay before each login response (s)')
+    parser.add_argument('--bandwidth', type=int, help='Maximum output rate (bytes/s)')
+    parser.add_argument('--page-lines', type=int, help='Page output (lines per page) until paging is disabled')
+    parser.add_argument('--auth-failure-rate', type=float, default=0, help='Share of logins failing (0 to 1)')
+    parser.add_argument('--max-forwards', type=int, help='Maximum number of channels forwarded at once')
+    parser.add_argument('--forward', action='store_true', help='Forward channels to their real destination')
+    args = parser.parse_args()
+
+    serve(args.port, ports=args.ports, device=MockDevice(
+        vendor=args.vendor, password=args.password, outputs=load_outputs(args.vendor, args.outputs), latency=args.latency,
+        login_latency=args.login_latency, bandwidth=args.bandwidth, page_lines=args.page_lines,
+        auth_failure_rate=args.auth_failure_rate, max_forwards=args.max_forwards, forward=args.forward))
@@ -0,0 +1,77 @@
+"""
+
+    Pooled polling - Polls the same hosts (local mock SSH server) several times with 'interaction()', connecting every
+      round (no pool) against keeping the sessions in a connection pool between rounds.
+
+"""
+
+# Example output:
+
+# Hosts: 100, rounds: 3
+# Round   No pool   Pool
+# 1       1.81s     1.45s
+# 2       1.83s     0.08s
+# 3       1.40s     0.09s
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+
+def poll(port, hosts, rounds, pool=None):
+
+    from starlight.ssh.bin import interaction as threaded
+
+    # Time each round of polling (one task per host):
+    timings = []
+    for _ in range(rounds):
+        tasks = [{
+            'host': '127.0.0.1',
+            'port': port,
+            'authentication': {'username': 'user', 'password': 'password'},
+            'command_list': ['uptime'],
+            'transcript': 'ring',
+        } for _ in range(hosts)]
+        start = time.perf_counter()
+        threaded.interaction(tasks, pool=pool)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--hosts', type=int, default=100, help='Number of hosts (tasks) polled each round')
+    parser.add_argument('--rounds', type=int, default=3, help='Number of rounds')
+    parser.add_argument('--port', type=int, default=2222, help='Port used for the mock SSH server')
+    args = parser.parse_args()
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_server.py'),
+         '--port', str(args.port)])
+    time.sleep(2)
+
+    try:
+        from starlight.ssh.bin import interaction
+        from starlight.ssh.bin.pool import ConnectionPool
+        from starlight.ssh.bin.session import SessionManager
+
+        logging.getLogger('starlight').setLevel(logging.WARNING)
+        interaction.dsm = SessionManager(max_sessions=args.hosts)
+
+        no_pool = poll(args.port, args.hosts, args.rounds)
+        pool = ConnectionPool()
+        pooled = poll(args.port, args.hosts, args.rounds, pool)
+        pool.close()
+
+        print(f"Hosts: {args.hosts}, rounds: {args.rounds}")
+        print(f"{'Round':<7} {'No pool':<9} Pool")
+        for index, (first, second) in enumerate(zip(no_pool, pooled)):
+            print(f"{index + 1:<7} {f'{first:.2f}s':<9} {second:.2f}s")
+    finally:
+        server.terminate()
@@ -0,0 +1,92 @@
+"""
+
+    Replay session - Replays a recorded session (see 'replay.py') to time starlight's own share of a session: 'connect',
+      'send_command' and the output parsing, without the network or the device. Records one against the local mock
+      SSH server first, unless a recording is given ('--recording', e.g.: of a real device, with its '--commands').
+
+"""
+
+# Example output:
+
+# Recorded: 0.48s (connect 0.19s), 3 commands
+# Replay (recorded speed): 0.48s
+# Replay (no delays): 500 sessions, 0.28s, 1811.0 sessions/s, 0.55ms per session
+
+import argparse
+import cProfile
+import logging
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+
+def run(commands, **kwargs):
+
+    from starlight.ssh.bin.session import SSHSession
+
+    # Connect, send the commands and disconnect, timing the session:
+    start = time.perf_counter()
+    session = SSHSession(
+        host='127.0.0.1', authentication={'username': 'user', 'password': 'password'}, transcript='off', **kwargs)
+    session.connect()
+    connected = time.perf_counter()
+    if session.ssh_error is not None:
+        raise SystemExit(f"Session failed: {session.ssh_error}")
+    session.send_commands(commands)
+    session.disconnect()
+    return time.perf_counter() - start, connected - start
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recording', help='Recording to replay (default: record one against the mock server)')
+    parser.add_argument('--commands', nargs='+', default=['show version', 'show running-config', 'show clock'],
+                        help='Commands sent (as when the session was recorded)')
+    parser.add_argument('--sessions', type=int, default=500, help='Number of sessions replayed with no delays')
+    parser.add_argument('--port', type=int, default=2222, help='Port used for the mock SSH server')
+    parser.add_argument('--profile', action='store_true', help='Profile the replays, listing the slowest functions')
+    args = parser.parse_args()
+
+    from starlight.ssh.bin.replay import Recording
+
+    logging.getLogger('starlight').setLevel(logging.WARNING)
+    path = args.recording
+
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), 'session.jsonl')
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_server.py'),
+             '--port', str(args.port), '--vendor', 'cisco', '--latency', '0.05', '--page-lines', '24'])
+        time.sleep(2)
+        try:
+            duration, connect_time = run(args.commands, port=args.port, record=path)
+        finally:
+            server.terminate()
+        print(f"Recorded: {duration:.2f}s (connect {connect_time:.2f}s), {len(args.commands)} commands")
+
+    recording = Recording.load(path)
+
+    duration, _ = run(args.commands, replay=recording)
+    print(f"Replay (recorded speed): {duration:.2f}s")
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    start = time.perf_counter()
+    for _ in range(args.sessions):
+        run(args.commands, replay=recording, replay_speed=0)
+    duration = time.perf_counter() - start
+    if profiler is not None:
+        profiler.disable()
+
+    print(f"Replay (no delays): {args.sessions} sessions, {duration:.2f}s, {args.sessions / duration:.1f} sessions/s, "
+          f"{duration / args.sessions * 1000:.2f}ms per session")
+
+    if profiler is not None:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
@@ -0,0 +1,423 @@
+"""
+
+    Benchmark suite - Times each stage of the pipeline on its own: escape code removal ('strip_ansi', 'AnsiStripper'),
+      prompt identification ('id_by_prompt'), 'send_command' reading large outputs (replayed, see 'replay.py'), the
+      output parsers ('analyze()' in 'ssh/lib/analysis/<vendor>/') on small, medium and very large inputs, and
+      'render_output' on 100k rows.
+
+    Results are compared against a baseline (JSON, see '--baseline'), and anything slower than the baseline by more
+      than '--threshold' is flagged as a regression (exit status 1). '--save' makes this run the baseline, e.g.: on
+      each release. Only compare runs made on the same machine, with the same version of python.
+
+    Parser inputs are samples of the command's output ('samples/<vendor>/<parser>.txt'), or else the mock server's
+      canned output for the command ('outputs/<vendor>/<command>.txt'), repeated up to the size of each input.
+      Parsers that need more than the output (e.g.: the command run) are also given the collection in
+      'samples/<vendor>/<parser>.json'. Parsers with no sample are listed as skipped, until one is added.
+      Benchmarks that can't run (e.g.: a module that fails to import) are listed as skipped, with the reason, as are
+      parser inputs expected to take longer than '--max-estimate' (scaling the time taken on the smaller input). A
+      benchmark that ran in the baseline but now fails or is skipped is a regression.
+
+"""
+
+# Example output:
+
+# Benchmark                                          Size        Median     Min        Baseline   Change
+# strip_ansi plain                                   1.0 MB      0.81ms     0.74ms     0.82ms     -1.7%
+# id_by_prompt cisco (x1000)                         -           3.32ms     3.20ms     3.30ms     +0.6%
+# send_command buffered (20 MB)                      20.0 MB     590.68ms   562.73ms   584.12ms   +1.1%
+# send_command streamed (20 MB)                      20.0 MB     39.20ms    35.96ms    38.75ms    +1.2%
+# analysis cisco.show_running_config medium          0.1 MB      2.36s      2.30s      1.87s      +26.2% !
+# analysis cisco.show_running_config large           -           skipped: too slow, estimated 236.02s (from ...
+# analysis cisco.show_vlan small                     0.0 MB      0.09ms     0.08ms     0.09ms     +2.3%
+# render_output grid (100k rows)                     -           skipped: SyntaxError: f-string expression part ...
+#
+# 1 regression (slower than the baseline by more than 20%).
+
+import argparse
+import copy
+import datetime
+import importlib
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import time
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.path.join(BENCHMARK_PATH, '..', 'src')
+
+sys.path.insert(0, SOURCE_PATH)
+sys.path.insert(1, os.path.join(SOURCE_PATH, 'starlight'))   # Parsers import 'ssh.lib.analysis...'
+
+
+class Case:
+
+    """
+        One benchmark: 'run' is timed, 'setup' (its result is passed to 'run') and 'teardown' are not.
+    """
+
+    def __init__(
+            self, name: str, run, setup=None, teardown=None, size: int = None, skipped: str = None,
+            scales: str = None):
+        self.name = name                               # Name (key in the baseline)
+        self.run = run                                 # Function timed
+        self.setup = setup                             # Prepares each run (not timed)
+        self.teardown = teardown                       # Cleans up after each run (not timed)
+        self.size = size                               # Size of the input (bytes), if any
+        self.skipped = skipped                         # Reason the benchmark can't run
+        self.scales = scales                           # Same benchmark on a smaller input (see 'estimate')
+
+
+def measure(case: Case, repeat: int, max_time: float):
+
+    # Time 'repeat' runs (after a warm-up run), fewer if they take longer than 'max_time' in total:
+    timings = []
+    spent = 0
+    for index in range(repeat + 1):
+        state = case.setup() if case.setup is not None else None
+        start = time.perf_counter()
+        case.run(state)
+        elapsed = time.perf_counter() - start
+        if case.teardown is not None:
+            case.teardown(state)
+        spent += elapsed
+        if index > 0:
+            timings.append(elapsed)
+        if spent > max_time and len(timings) > 0:
+            break
+
+    return {'median': statistics.median(timings), 'min': min(timings), 'runs': len(timings), 'size': case.size}
+
+
+def estimate(case: Case, results: dict):
+
+    # Time a run is expected to take, scaling (linearly) the time taken on the smaller input. None if not known:
+    smaller = results.get(case.scales) if case.scales is not None else None
+    taken = smaller.get('median', smaller.get('estimate')) if smaller is not None else None
+    if taken is None or not smaller.get('size'):
+        return None
+    return taken * case.size / smaller['size']
+
+
+def repeat_to_size(text: str, size: int):
+    return (text * (size // max(len(text), 1) + 1))[:size]
+
+
+def canned_outputs(vendor: str = None):
+
+    # Canned outputs of the mock server ('outputs/<vendor>/<command>.txt'): {(vendor, file name): output}:
+    outputs = {}
+    path = os.path.join(BENCHMARK_PATH, 'outputs')
+    for name in sorted(os.listdir(path)):
+        if vendor is not None and name != vendor:
+            continue
+        for file_name in sorted(os.listdir(os.path.join(path, name))):
+            if file_name.endswith('.txt'):
+                with open(os.path.join(path, name, file_name), encoding='utf-8') as fh:
+                    outputs[(name, file_name[:-4])] = fh.read()
+    return outputs
+
+
+def parser_samples(vendor: str):
+
+    # Sample outputs for the vendor's parsers ('samples/<vendor>/<parser>.txt'), with the collection each is given
+    #   ('<parser>.json', if any): {parser: (output, collection)}:
+    samples = {}
+    path = os.path.join(BENCHMARK_PATH, 'samples', vendor)
+    for file_name in sorted(os.listdir(path)) if os.path.isdir(path) else []:
+        if file_name.endswith('.txt'):
+            with open(os.path.join(path, file_name), encoding='utf-8') as fh:
+                samples[file_name[:-4]] = (fh.read(), None)
+    for parser in samples:
+        if os.path.exists(os.path.join(path, f"{parser}.json")):
+            with open(os.path.join(path, f"{parser}.json"), encoding='utf-8') as fh:
+                samples[parser] = (samples[parser][0], json.load(fh))
+    return samples
+
+
+def strip_ansi_cases():
+
+    from starlight.ssh.bin.utilities import AnsiStripper, strip_ansi
+
+    size = 1_000_000
+    plain = repeat_to_size("GigabitEthernet1/0/1 is up, line protocol is up (connected)\r\n", size)
+    coloured = repeat_to_size(
+        "\x1b[1;34mGigabitEthernet1/0/1\x1b[0m is \x1b[32mup\x1b[0m, line protocol is up (connected) \x1b[K\r\n", size)
+
+    def feed(chunks):
+        stripper = AnsiStripper()
+        for chunk in chunks:
+            stripper.feed(chunk)
+        stripper.flush()
+
+    for name, text in [('plain', plain), ('coloured', coloured)]:
+        data = text.encode('utf-8')
+        chunks = [data[start:start + 65536] for start in range(0, len(data), 65536)]
+        yield Case(f"strip_ansi {name}", lambda _, text=text: strip_ansi(text), size=len(data))
+        yield Case(f"AnsiStripper {name} (64 KB chunks)", lambda _, chunks=chunks: feed(chunks), size=len(data))
+
+
+def id_by_prompt_cases():
+
+    from starlight.ssh.bin.identify import id_by_prompt
+
+    prompts = {
+        'cisco': 'core-switch-01#',
+        'aruba': '(mobility-controller-01) *#',
+        'linux': 'admin@server-01:~$ ',
+        'f5': 'admin@(bigip-01)(cfg-sync Standalone)(Active)(/Common)(tmos)# ',
+        'unknown': 'Press any key to continue',
+    }
+    for name, prompt in prompts.items():
+        yield Case(f"id_by_prompt {name} (x1000)", lambda _, prompt=prompt: [id_by_prompt(prompt) for _ in range(1000)])
+
+
+def send_command_cases():
+
+    from starlight.ssh.bin.replay import Recording
+    from starlight.ssh.bin.session import SSHSession
+
+    logging.getLogger('starlight').setLevel(logging.WARNING)
+
+    def recording(size):
+
+        # Session answering one command with 'size' bytes of output, received in 64 KB chunks:
+        output = repeat_to_size(
+            "GigabitEthernet1/0/1 is up, line protocol is up (connected)\r\n", size).encode('utf-8')
+        events = [(0, 'recv', b'\r\ncore-switch-01#'), (0, 'send', b'show interface\n'),
+                  (0, 'recv', b'show interface\r\n')]
+        events += [(0, 'recv', output[start:start + 65536]) for start in range(0, len(output), 65536)]
+        events += [(0, 'recv', b'\r\ncore-switch-01#')]
+        return Recording({'host': 'core-switch-01', 'port': 22}, events)
+
+    def connect(replay):
+        session = SSHSession(
+            'core-switch-01', {'username': 'user', 'password': 'password'}, replay=replay, replay_speed=0,
+            disable_paging=False, transcript='off', remember_authentication=False)
+        session.connect()
+        return session
+
+    for size, size_name in [(1_000_000, '1 MB'), (20_000_000, '20 MB')]:
+        replay = recording(size)
+        yield Case(f"send_command buffered ({size_name})", lambda session: session.send_command('show interface'),
+                   setup=lambda replay=replay: connect(replay), teardown=lambda session: session.disconnect(),
+                   size=size)
+        yield Case(f"send_command streamed ({size_name})",
+                   lambda session: session.send_command('show interface', sink=lambda chunk: None),
+                   setup=lambda replay=replay: connect(replay), teardown=lambda session: session.disconnect(),
+                   size=size)
+
+
+def analysis_cases():
+
+    path = os.path.join(SOURCE_PATH, 'starlight', 'ssh', 'lib', 'analysis')
+    for vendor in sorted(os.listdir(path)):
+        if not os.path.isdir(os.path.join(path, vendor)) or vendor.startswith('__'):
+            continue
+
+        # The vendor's canned outputs, by the name of the parser for the command (e.g.: 'show_running_config' for
+        #   'show running-config', 'uname_minus_a' for 'uname -a'), and its parsers' own samples:
+        outputs = {}
+        if os.path.isdir(os.path.join(BENCHMARK_PATH, 'outputs', vendor)):
+            outputs = {re.sub(r'\W+', '_', command.replace('_-', '_minus_')).strip('_'): (output, None)
+                       for (_, command), output in canned_outputs(vendor).items()}
+        outputs.update(parser_samples(vendor))
+
+        for file_name in sorted(os.listdir(os.path.join(path, vendor))):
+            if not file_name.endswith('.py') or file_name.startswith('__'):
+                continue
+            parser = file_name[:-3]
+            name = f"analysis {vendor}.{parser}"
+            try:
+                module = importlib.import_module(f"ssh.lib.analysis.{vendor}.{parser}")
+            except Exception as err:
+                yield skipped(name, err)
+                continue
+            if not hasattr(module, 'analyze'):
+                continue
+
+            # The parser's own output (timing it on other commands' outputs would say little about it):
+            if parser not in outputs:
+                for size_name, _ in ANALYSIS_SIZES:
+                    yield Case(f"{name} {size_name}", None,
+                               skipped=f"no sample output (add 'samples/{vendor}/{parser}.txt')")
+                continue
+
+            # Parsers add to the collection they are given, so each run gets a copy (not timed):
+            sample, collection = outputs[parser]
+            smaller = None
+            for size_name, size in ANALYSIS_SIZES:
+                text = sample if size is None else repeat_to_size(sample, size)
+                yield Case(f"{name} {size_name}",
+                           lambda given, analyze=module.analyze, text=text: analyze(text, given),
+                           setup=lambda collection=collection: copy.deepcopy(collection),
+                           size=len(text.encode('utf-8')), scales=smaller)
+                smaller = f"{name} {size_name}"
+
+
+def render_output_cases():
+
+    try:
+        from starlight.api.bin.output.render_output import render_output
+    except (Exception, SyntaxError) as err:
+        for output_type in RENDER_TYPES:
+            yield skipped(f"render_output {output_type} (100k rows)", err)
+        return
+
+    fields = ['host', 'vendor', 'version', 'uptime', 'interfaces']
+    rows = [{
+        'host': f"switch-{index:06}",
+        'vendor': 'Cisco',
+        'version': '17.9.4a',
+        'uptime': index * 60,
+        'interfaces': [f"Gi1/0/{port}" for port in range(1, 4)],
+    } for index in range(100_000)]
+
+    for output_type in RENDER_TYPES:
+        yield Case(f"render_output {output_type} (100k rows)",
+                   lambda _, output_type=output_type: render_output(list(fields), rows, output_type))
+
+
+def skipped(name: str, err: BaseException):
+    return Case(name, None, skipped=f"{type(err).__name__}: {err}")
+
+
+def collect(groups, pattern: str = None, quick: bool = False):
+
+    # Benchmarks of the groups, or a group's import error (listed as skipped), filtered:
+    cases = []
+    for group_name, group in groups:
+        try:
+            group_cases = list(group())
+        except (Exception, SyntaxError) as err:
+            group_cases = [skipped(group_name, err)]
+        for case in group_cases:
+            if pattern is not None and not re.search(pattern, case.name):
+                continue
+            if quick and case.name.endswith(' large'):
+                continue
+            cases.append(case)
+    return cases
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+
+    # Change against the baseline for each benchmark (None if not in it), and the regressions (including benchmarks
+    #   that ran in the baseline, but now fail or are skipped):
+    changes = {}
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is not None and 'median' in base and 'median' not in result:
+            changes[name] = None
+            regressions.append(name)
+            continue
+        if 'median' not in result or base is None or 'median' not in base or base['median'] == 0:
+            changes[name] = None
+            continue
+        changes[name] = result['median'] / base['median'] - 1
+        if changes[name] > threshold:
+            regressions.append(name)
+    return changes, regressions
+
+
+def lost(name: str, baseline: dict):
+
+    # Flag for a benchmark that ran in the baseline, but now fails or is skipped (a regression, see 'compare'):
+    return ' !' if 'median' in baseline.get('results', {}).get(name, {}) else ''
+
+
+def duration(seconds: float):
+    return f"{seconds * 1000:.2f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+# Parser input sizes (None: the sample as is):
+ANALYSIS_SIZES = [('small', None), ('medium', 100_000), ('large', 10_000_000)]
+
+RENDER_TYPES = ['grid', 'csv', 'html']
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--baseline', default=os.path.join(BENCHMARK_PATH, 'baseline.json'),
+                        help='Baseline results file (JSON)')
+    parser.add_argument('--save', action='store_true', help='Save the results as the baseline')
+    parser.add_argument('--output', help='Also write the results to this file (JSON)')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Slower than the baseline by more than this share is a regression')
+    parser.add_argument('--filter', help='Only run benchmarks matching this regular expression')
+    parser.add_argument('--quick', action='store_true', help="Leave out the parsers' large inputs")
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs of each benchmark')
+    parser.add_argument('--max-time', type=float, default=5, help='Stop repeating a benchmark after this long (s)')
+    parser.add_argument('--max-estimate', type=float, default=30,
+                        help='Skip parser inputs expected to take longer than this (s), from the smaller input')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as fh:
+            baseline = json.load(fh)
+        if baseline.get('python') != platform.python_version():
+            print(f"Baseline was made with python {baseline.get('python')}, comparing with "
+                  f"{platform.python_version()}.\n")
+
+    groups = [('strip_ansi', strip_ansi_cases), ('id_by_prompt', id_by_prompt_cases),
+              ('send_command', send_command_cases), ('analysis', analysis_cases),
+              ('render_output', render_output_cases)]
+
+    results = {}
+    print(f"{'Benchmark':<50} {'Size':<11} {'Median':<10} {'Min':<10} {'Baseline':<10} Change")
+    for case in collect(groups, args.filter, args.quick):
+
+        if case.skipped is not None:
+            results[case.name] = {'skipped': case.skipped}
+            print(f"{case.name:<50} {'-':<11} skipped: {case.skipped[:80]}{lost(case.name, baseline)}")
+            continue
+
+        # Parsers that don't scale (linearly) could run for hours on the large inputs:
+        expected = estimate(case, results)
+        if expected is not None and expected > args.max_estimate:
+            results[case.name] = {'skipped': f"too slow, estimated {duration(expected)} (from '{case.scales}')",
+                                  'estimate': expected, 'size': case.size}
+            print(f"{case.name:<50} {'-':<11} skipped: {results[case.name]['skipped']}{lost(case.name, baseline)}")
+            continue
+
+        try:
+            result = measure(case, args.repeat, args.max_time)
+        except Exception as err:
+            results[case.name] = {'error': f"{type(err).__name__}: {err}"}
+            print(f"{case.name:<50} {'-':<11} error: {results[case.name]['error'][:80]}{lost(case.name, baseline)}")
+            continue
+
+        results[case.name] = result
+        change, _ = compare({case.name: result}, baseline, args.threshold)
+        base = baseline.get('results', {}).get(case.name, {}).get('median')
+        size = f"{case.size / 1e6:.1f} MB" if case.size is not None else '-'
+        flag = ' !' if change[case.name] is not None and change[case.name] > args.threshold else ''
+        print(f"{case.name:<50} {size:<11} {duration(result['median']):<10} {duration(result['min']):<10} "
+              f"{duration(base) if base is not None else '-':<10} "
+              f"{f'{change[case.name]:+.1%}' if change[case.name] is not None else '-'}{flag}")
+
+    report = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    _, regressions = compare(results, baseline, args.threshold)
+    if len(baseline) > 0:
+        print(f"\n{len(regressions)} regression{'' if len(regressions) == 1 else 's'} (slower than the baseline by "
+              f"more than {args.threshold:.0%}, or no longer running).")
+
+    for path in ([args.baseline] if args.save else []) + ([args.output] if args.output else []):
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Results saved to '{path}'.")
+
+    sys.exit(1 if len(regressions) > 0 else 0)
+
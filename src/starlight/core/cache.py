@@ -0,0 +1,120 @@
+"""
+
+    Cache module: small JSON stores kept between runs (e.g.: what was learned about jump-hosts), in the project's
+      'cache' directory (next to 'logs').
+
+"""
+import atexit
+import json
+import os
+import threading
+
+from .logger import logger, log_path
+
+
+def read_cache(name: str) -> dict:
+
+    """
+        Reads a cache. The file is only read again once it has changed, so this is cheap to call for every session.
+    :param name: Name of the cache
+    :return: dict of cached items (empty if the cache does not exist or can't be read), without those not written yet
+               (see 'cached'). Don't modify it, use 'update_cache'.
+    """
+
+    try:
+        modified = os.stat(cache_file(name)).st_mtime_ns
+    except OSError:
+        return {}
+
+    if name in loaded and loaded[name][0] == modified:
+        return loaded[name][1]
+
+    try:
+        with open(cache_file(name), encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as err:
+        logger.warning("Unable to read cache '%s': %s", name, err)
+        return {}
+
+    data = data if isinstance(data, dict) else {}
+    loaded[name] = (modified, data)
+    return data
+
+
+def cached(name: str) -> dict:
+
+    # Items of a cache, including those not written yet (see 'update_cache' with 'defer'):
+    data = read_cache(name)
+    items = pending.get(name)
+    if not items:
+        return data
+    data = dict(data)
+    for key, value in list(items.items()):
+        if value is None:
+            data.pop(key, None)
+        else:
+            data[key] = value
+    return data
+
+
+def update_cache(name: str, key: str, value, defer: bool = False):
+
+    """
+        Stores (or, if value is None, removes) an item in a cache. The file is replaced in one step, so readers never
+          see a partly written cache.
+    :param name: Name of the cache
+    :param key: Item key
+    :param value: Item value (must be JSON serialisable)
+    :param defer: Only keep the item (see 'cached') until the next 'flush_cache' (e.g.: at the end of 'interaction()',
+                    or on exit), so a run writes the file once rather than once per item
+    """
+
+    with cache_lock:
+
+        pending.setdefault(name, {})[key] = value
+        if not defer:
+            write_cache(name)
+
+
+def flush_cache(name: str = None):
+
+    """
+        Writes the items kept by 'update_cache' with 'defer'.
+    :param name: Name of the cache, defaults to all of them
+    """
+
+    with cache_lock:
+        for name in [name] if name is not None else list(pending):
+            if name in pending:
+                write_cache(name)
+
+
+def write_cache(name: str):
+
+    # Write a cache with its pending items (call holding 'cache_lock'):
+    data = cached(name)
+    pending.pop(name, None)
+
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+        temp_file = f"{cache_file(name)}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(temp_file, cache_file(name))
+        loaded[name] = (os.stat(cache_file(name)).st_mtime_ns, data)
+    except OSError as err:
+        logger.warning("Unable to write cache '%s': %s", name, err)
+
+
+def cache_file(name: str) -> str:
+    return f"{cache_path}/{name}.json"
+
+
+# Configuration
+cache_path = os.path.join(os.path.dirname(log_path), 'cache')
+cache_lock = threading.Lock()
+loaded = {}  # Caches read: name -> (file modification time, items)
+pending = {}  # Items not written yet: name -> {key: value, None to remove it}
+atexit.register(flush_cache)
@@ -0,0 +1,82 @@
+"""
+
+    Async SSH Session (async_session.py): asyncio version of 'SSHSession' offering the same 'connect', 'send_command'
+      and 'disconnect' methods as coroutines.
+
+    Commands run on the event loop: 'send_command' uses the same prompt identification, auto-response and known error
+      handling as 'SSHSession', but waits for channel data with the event loop instead of a blocked thread. Paramiko's
+      handshake and authentication are blocking, so 'connect' runs in an executor (limit its size to limit the number
+      of concurrent connection attempts). Paramiko still runs one transport thread per connection.
+
+"""
+
+import asyncio
+
+from .session import SSHSession
+from .batch import batch_steps, batch_supported
+from .exec import exec_commands
+from .send import command_steps
+from .stream import sink_output
+from .utilities import async_wait_for_data
+
+
+class AsyncSSHSession:
+
+    """
+        AsyncSSHSession
+    """
+
+    def __init__(self, *args, executor=None, session: SSHSession = None, **kwargs):
+
+        # Jump-hosts may be given as 'AsyncSSHSession' objects:
+        if isinstance(kwargs.get('connect_via'), AsyncSSHSession):
+            kwargs['connect_via'] = kwargs['connect_via'].session
+
+        # Underlying session (holds all session properties), new or existing (e.g.: taken from a connection pool):
+        self.session = session if session is not None else SSHSession(*args, **kwargs)
+        self.executor = executor                       # Executor used to connect (None uses the loop's default)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def __repr__(self):
+        return f"AsyncSSHSession_{self.session.host}:{self.session.port}"
+
+    async def connect(self):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.session.connect)
+
+    async def send_command(self, command, sink=None):
+
+        if self.session.mode == 'exec':
+            return sink_output((await self.send_commands([command]))[0], sink)
+
+        steps = command_steps(self.session, command, sink)
+        try:
+            while True:
+                await async_wait_for_data(self.session.session_object, next(steps))
+        except StopIteration as finished:
+            return finished.value
+
+    async def send_commands(self, command_list: list):
+
+        # Exec mode reads all of its channels at once (blocking), so runs in the executor:
+        if self.session.mode == 'exec':
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, exec_commands, self.session, command_list)
+
+        if self.session.batch and len(command_list) > 1 and batch_supported(self.session, command_list):
+            steps = batch_steps(self.session, command_list)
+            try:
+                while True:
+                    await async_wait_for_data(self.session.session_object, next(steps))
+            except StopIteration as finished:
+                return finished.value
+
+        results = []
+        for command in command_list:
+            if self.session.ssh_error is None:
+                results.append(await self.send_command(command))
+        return results
+
+    async def disconnect(self):
+        return self.session.disconnect()
@@ -0,0 +1,249 @@
+"""
+
+    SSH Batch (batch.py): Sends a list of commands in one go (SSHSession 'batch' option) rather than waiting for the
+      prompt after each command, so a batch costs one round-trip instead of one per command.
+
+    A marker is sent after each command, using the 'batch' settings of the prompt identified for the device (see
+      'SSH_PROMPTS'), e.g.: "echo 'marker'" for shells, or a '!' comment for Cisco/Arista. The output received is split
+      back into one output dict per command on the lines ending with each marker, in the same format 'send_command'
+      returns. Devices without 'batch' settings fall back to sending the commands one at a time, as do sessions where
+      paging is not known to be disabled: a paging prompt would read the commands typed ahead as its keystrokes.
+
+    Shells get all commands on one line (so the echo of what was typed ahead doesn't land in the output), each run with
+      'eval' (see the 'command' batch setting), so comments ('#') and background commands ('&') stay within their own
+      command.
+
+    All commands are sent before any completes, so unlike sending them one at a time, commands after one that fails
+      still run. If an auto-response is needed all the same (e.g.: a confirmation), what was typed ahead may have been
+      read as the answer: once a marker sent after the reply comes back, the command running when it happened keeps its
+      output (with an 'error'), commands whose marker wasn't seen are sent again one at a time, and so are the
+      session's later command lists.
+
+"""
+
+import re
+import shlex
+import time
+import uuid
+
+import starlight.core.logger as logger
+from .identify import id_by_known_prompt, auto_reponse
+from .send import send_command
+from .utilities import wait_for_data
+
+
+def send_batch(self, commands: list):
+
+    """
+
+        Sends a list of commands in a single write, and returns the output of each command.
+
+    :param commands: List of commands
+    :return: List of output dicts (one per command, as returned by 'send_command')
+    """
+
+    if not batch_supported(self, commands):
+        results = []
+        for command in commands:
+            if self.ssh_error is None:
+                results.append(send_command(self, command))
+        return results
+
+    steps = batch_steps(self, commands)
+    try:
+        while True:
+            wait_for_data(self.session_object, next(steps))
+    except StopIteration as finished:
+        return finished.value
+
+
+def batch_supported(self, commands: list):
+
+    # Batches need the device's marker settings, and can't include commands closing the session:
+    if self.ssh_error is not None or not isinstance(self.prompt, dict) or 'batch' not in self.prompt or self.paging:
+        return False
+    return all(isinstance(command, str) and command.lower() not in ['exit', 'quit', 'logout'] for command in commands)
+
+
+def batch_steps(self, commands: list):
+
+    """
+
+        Sends a batch of commands and splits what is received back into the output of each command. Like
+          'command_steps', this yields the number of seconds left before the session times out whenever it needs more
+          data, and returns the list of output dicts once the prompt follows the last marker.
+
+    """
+
+    logger_prefix = f'{self.username}@{self.host}:{self.port}'
+    if self.session_id > 0:
+        logger_prefix += f" ({self.session_id})"
+
+    batch = self.prompt['batch']
+    token = f"STARLIGHT_{uuid.uuid4().hex[:8]}"
+    markers = [f"{token}_{index}" for index in range(len(commands))]
+    marker_commands = [batch['marker'].format(marker=marker) for marker in markers]
+    marker_re = re.compile(rf"{token}_(\d+)$")
+    sync = f"{token}_sync"
+
+    # Commands and markers, on one line (shells) or one per line (CLIs echoing each line as it is read):
+    sent = [batch['command'].format(command=shlex.quote(command)) if 'command' in batch else command
+            for command in commands]
+    lines = [line for pair in zip(sent, marker_commands) for line in pair]
+    payload = batch['separator'].join(lines) if batch.get('separator') else '\n'.join(lines)
+
+    logger.debug("%s: Sending batch of %s commands...", logger_prefix, len(commands))
+    time_sent = time.time()
+    self.session_object_interact_time = time_sent
+    self.session_object.send(payload + '\n')
+
+    results = [{'command': command, 'time_sent': time_sent, 'prompt': ''} for command in commands]
+    segments = [[] for _ in range(len(commands) + 1)]  # Lines received for each command (and after the last)
+    completed = set()               # Commands whose marker was received
+    partial = ''                    # Text received after the last line break (prompt, or part of a line)
+    found = 0                       # Command running (markers are received in order, unless one was read as a reply)
+    raw = bytearray()               # Received (raw) output
+    interrupted = None              # Command running when an auto-response was needed, and the reply sent
+    synced = False                  # Marker sent after the auto-response received (all typed ahead was read)
+    history = []
+
+    while self.ssh_error is None:
+
+        while self.session_object.recv_ready():
+            raw_input = self.session_object.recv(65536)
+            raw += raw_input
+            self.raw_transcript.write(raw_input)
+            text = self.ansi_stripper.feed(raw_input)
+            history.append(text)
+            self.session_object_interact_time = time.time()
+
+            # Split complete lines into each command's output, on the lines ending with the markers (output of a command
+            #   starts once the previous command's marker is received):
+            *complete, partial = (partial + text).split('\n')
+            for line in complete:
+                line = line.rstrip('\r')
+                if found < len(markers):
+                    results[found].setdefault('time_first_byte', time.time())
+                marker = marker_re.search(line)
+
+                # A question already answered, by what was typed ahead:
+                if interrupted is None and marker is None and sync not in line:
+                    auto_reply = auto_reponse(line, self.answer_paging)
+                    if auto_reply:
+                        interrupted = (found, auto_reply['found'])
+                        self.session_object.send(batch['marker'].format(marker=sync) + '\n')
+
+                if sync in line:
+                    synced = synced or line.endswith(sync)   # Its echo (shells) or the marker itself
+                elif marker is not None and int(marker.group(1)) >= found:
+                    index = int(marker.group(1))
+                    results[index]['time_completed'] = time.time()
+                    completed.add(index)
+                    found = index + 1
+                else:
+                    segments[found].append(line)
+
+        done = synced if interrupted is not None else found == len(markers)
+        if done and id_by_known_prompt(partial, self.prompt):
+            break
+
+        # Check for any auto-response content (e.g.: a confirmation). What was typed ahead may have been read as the
+        #   answer, so send a marker to find out when all of it has been read:
+        if partial != '':
+            auto_reply = auto_reponse(partial, self.answer_paging)
+            if auto_reply:
+                logger.debug(
+                    "%s: Found '%s', replied with '%s'.", logger_prefix, auto_reply['found'], auto_reply['reply_with'])
+                self.session_object.send(auto_reply['reply_with'])
+                partial = ''
+                if interrupted is None:
+                    interrupted = (found, auto_reply['found'])
+                    self.session_object.send(batch['marker'].format(marker=sync) + '\n')
+
+        if self.session_object.closed or self.session_object.eof_received:
+            self.ssh_error = "Connection lost"
+            break
+
+        if (time.time() - time_sent) > self.session_object_timeout:
+            self.ssh_error = "Timed out. No prompt detected."
+            break
+
+        yield self.session_object_timeout - (time.time() - time_sent)
+
+    history.append(self.ansi_stripper.flush())
+    self.history_transcript.write(''.join(history))
+
+    # Received bytes of each command, up to the end of its marker line (the prompt goes with the last command):
+    raw_outputs = []
+    position = 0
+    for index in range(len(commands)):
+        end = position
+        if index in completed:
+            end = re.compile(re.escape(markers[index].encode()) + rb"\r*\n").search(raw, position)
+            end = end.end() if end is not None else position
+        raw_outputs.append(bytes(raw[position:end]))
+        position = end
+    if len(commands) > 0:
+        raw_outputs[-1] += bytes(raw[position:])
+
+    resend = []
+    for index, output in enumerate(results):
+
+        # Interrupted by an auto-response: keep the output of the command running then, send the others again:
+        if interrupted is not None and synced and index == interrupted[0]:
+            output.setdefault('time_completed', time.time())
+            output['error'] = f"Interrupted by '{interrupted[1]}' (sent in a batch)"
+
+        elif index not in completed and interrupted is not None and synced:
+            resend.append(index)
+            continue
+
+        elif index not in completed:
+            output['time_failed'] = time.time()
+            output['ssh_error'] = self.ssh_error
+            continue
+
+        # Drop the echo of the command (and of the rest of the batch, for shells) from the start of its output. CLIs
+        #   echo each line as it is read, so anything before the echo is left over from the previous line (e.g.: a
+        #   marker read in part as a reply):
+        segment = segments[index]
+        if len(segment) > 0 and marker_commands[-1] in segment[0]:
+            segment = segment[1:]
+        elif not batch.get('separator'):
+            echo = next((position for position, line in enumerate(segment) if line.endswith(sent[index])), None)
+            segment = segment[echo + 1:] if echo is not None else segment
+
+        output['prompt'] = self.prompt['prompt']
+        output['output'] = '\n'.join(segment)
+        output['raw_output'] = raw_outputs[index]
+
+        # Check output for known errors, as received (the first one found is the session's error, as with
+        #   'send_command'):
+        output.setdefault('error', None)
+        for error_re in self.prompt.get('known_errors', []):
+            tmp = re.search(error_re, '\r\n'.join(segment), re.MULTILINE)
+            if tmp:
+                output['error'] = tmp.group(1).strip().capitalize()
+                logger.warning("%s: Command '%s' failed, error: '%s'.", logger_prefix, output['command'],
+                               output['error'])
+                if self.ssh_error is None:
+                    self.ssh_error = output['error']
+                break
+
+    # Commands typed ahead but not run (or not known to have run), and later command lists, are sent one at a time:
+    if interrupted is not None and synced:
+        logger.warning("%s: Batch interrupted by '%s', sending %s commands one at a time.",
+                       logger_prefix, interrupted[1], len(resend))
+        self.batch = False
+        for index in resend:
+            if self.ssh_error is None:
+                results[index] = send_command(self, commands[index])
+            else:
+                results[index]['time_failed'] = time.time()
+                results[index]['ssh_error'] = self.ssh_error
+
+    if len(completed) == len(markers):
+        logger.debug(
+            "%s: Batch of %s commands completed. (%.2fs)", logger_prefix, len(commands), time.time() - time_sent)
+
+    return results
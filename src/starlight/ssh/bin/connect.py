@@ -7,13 +7,18 @@
 """
 
 import time
+import random
 import socket
 import paramiko
 import re
 
 import starlight.core.logger as logger
+from starlight.core.cache import cached, update_cache
 from .identify import id_by_prompt, id_by_ssh_version
-from .utilities import strip_ansi
+from .send import send_command
+from .replay import ssh_client
+from .timing import ConnectionTimer, open_socket
+from .utilities import AnsiStripper, strip_ansi, wait_for_data
 
 def connect(self):
 
@@ -23,17 +28,32 @@ def connect(self):
     """
 
     tries = 0
+    last_error = None
     tries_text = {0: '1st', 1: '2nd', 2: '3rd', 3: '4th', 4: '5th'}
     stop_retries = False
+    retryable = False
+
+    # Connection attempts: all retries now (one after the other), or one (each call) if the caller schedules the
+    #   retries, waiting 'retry_interval' (backing off) between them:
+    attempts = 1 if self.defer_retries else self.retries
 
     self.status = 'connecting'
-    self.session_object = paramiko.SSHClient()
+    self.attempts += 1
+    self.session_object = ssh_client(self)
+    self.ssh_client = self.session_object
     self.session_object.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
-    # Iterate through authentication 'profiles':
-    for auth_item in self.authentication:
+    # Iterate through authentication 'profiles' (starting with the one that last worked for this host, if known):
+    remembered = remembered_authentication(self)
+    for auth_index in authentication_order(self, remembered):
+
+        # Profiles that failed for good on an earlier attempt (e.g.: authentication failed) aren't tried again:
+        if auth_index in self.failed_authentication:
+            continue
 
-        while tries < self.retries:
+        auth_item = self.authentication[auth_index]
+
+        while tries < attempts:
 
             attempt_text = ''
             if tries in tries_text:
@@ -44,6 +64,7 @@ def connect(self):
             done_sudo = False
             connect_start = time.time()
             self.session_object_start_time = time.time()
+            connection_timer = self.ssh_client.timer = ConnectionTimer()
             self.username = auth_item.get('username')
 
             # Check if we need to sudo after initial login:
@@ -57,16 +78,25 @@ def connect(self):
 
             try:
 
-                if self.jump_host is None:
+                if self.replay is not None:
+
+                    # Replay of a recorded session (see 'replay.py'), nothing is sent over the network:
+                    logger.debug("%s: Replaying SSH session...%s", logger_prefix, attempt_text)
+                    self.session_object.connect(hostname=self.host, port=self.port, username=self.username)
+
+                elif self.jump_host is None:
 
                     # Direct connection
                     logger.debug("%s: Attempting SSH connection...%s", logger_prefix, attempt_text)
 
+                    sock = open_socket(self.host, self.port, self.connection_timeout, connection_timer)
+                    self.address = sock.getpeername()[0]
                     self.session_object.connect(
                         look_for_keys=True,  # Set this to look for locally stored SSH keys (known_hosts).
                         hostname=self.host,
                         port=self.port,
                         timeout=self.connection_timeout,
+                        sock=sock,
                         username=self.username,
                         password=auth_item.get('password'),
                         allow_agent=False,
@@ -85,11 +115,32 @@ def connect(self):
                         else f"{jump_host.host}:{jump_host.port}", attempt_text)
 
                     jump_host_transport = self.jump_host.session_object.get_transport()
-                    jump_host_channel = jump_host_transport.open_channel(
-                        kind='direct-tcpip',
-                        dest_addr=(self.host, self.port),
-                        src_addr=(jump_host.host, jump_host.port),
-                        timeout=self.connection_timeout)
+                    jump_host_manager = getattr(jump_host, 'session_manager', None)
+                    open_start = time.time()
+                    try:
+                        jump_host_channel = jump_host_transport.open_channel(
+                            kind='direct-tcpip',
+                            dest_addr=(self.host, self.port),
+                            src_addr=(jump_host.host, jump_host.port),
+                            timeout=self.connection_timeout)
+                    except paramiko.SSHException as err:
+
+                        # Jump-host is out of capacity: back off, the task can be retried once sessions are freed.
+                        #   Paramiko keeps one refusal per transport, so of channels refused at the same time only one
+                        #   gets the reason, the others fail with 'Unable to open channel' (transport still active):
+                        refused = err.code in CAPACITY_ERRORS if isinstance(err, paramiko.ChannelException) else \
+                            str(err) == 'Unable to open channel.' and jump_host_transport.is_active()
+                        if refused and jump_host_manager is not None:
+                            if jump_host_manager.record_failure():
+                                self.status = 'throttled'
+                                self.ssh_error = f"Jump host '{jump_host.host}' busy ({getattr(err, 'text', 'Channel refused')})"
+                                logger.debug("%s: %s.", logger_prefix, self.ssh_error)
+                                return False
+                        raise
+
+                    if jump_host_manager is not None:
+                        jump_host_manager.record_open(time.time() - open_start, (self.host, self.port))
+                    connection_timer.mark('channel')
 
                     self.session_object.connect(
                         hostname=self.host,
@@ -152,7 +203,19 @@ def connect(self):
                     logger.warning("\n\nBANNER ERROR: {%s} -> {%s}\n\n", self.host, err)
                 else:
                     if get_banner is not None:
-                        self.history += strip_ansi(get_banner.decode('utf-8'))
+                        self.history_transcript.write(strip_ansi(get_banner.decode('utf-8')))
+                connection_timer.mark('banner')
+
+                # Exec mode: each command runs on its own channel, so there is no shell (or prompt) to wait for:
+                if self.mode == 'exec':
+                    self.authentication_index = auth_index
+                    remember_authentication(self, remembered)
+                    self.session_object_interact_time = time.time()
+                    self.timing = connection_timer.result()
+                    self.ssh_error = None
+                    logger.debug("%s: Ready to run commands. [Exec mode]", logger_prefix)
+                    return True
+
                 # Get welcome prompt:
                 inv_shell = None
                 try:
@@ -168,8 +231,11 @@ def connect(self):
                 except Exception as err:
                     logger.debug("%s: Connection Error: '%s'!", logger_prefix, err)
                     ssh_error = str(err)
+                else:
+                    connection_timer.mark('shell')
 
                 ssh_output = ''
+                self.ansi_stripper = AnsiStripper()
                 found_prompt = False
                 timer = 0
                 current_prompt = ''
@@ -179,10 +245,10 @@ def connect(self):
                     while inv_shell.recv_ready():
                         timer = 0
                         raw_input = inv_shell.recv(65536)
-                        self.raw += raw_input
+                        self.raw_transcript.write(raw_input)
 
                         # Check if data was received and if so, set the retries to 0:
-                        ssh_output += strip_ansi(raw_input.decode('utf-8', 'ignore'))
+                        ssh_output += self.ansi_stripper.feed(raw_input)
                         self.session_object_interact_time = time.time()
 
                         current_prompt = ssh_output.split('\n')[-1]
@@ -235,29 +301,47 @@ def connect(self):
                                                     "%s: Host appears to be a '%s' device! [Prompt]", logger_prefix,
                                                     vendor_string)
 
-                    if inv_shell.closed:
+                    if inv_shell.closed or inv_shell.eof_received:
                         self.ssh_error = "Connection lost"
                         break
 
                     if (time.time() - self.session_object_start_time) > self.connection_timeout:
-                        self.history = strip_ansi(self.raw.decode('utf-8'))
+                        self.history_transcript.write(ssh_output)
                         self.prompt = current_prompt
                         self.ssh_error = "Timed out. Unknown prompt."
                         stop_retries = True
                         break
 
-                    time.sleep(0.01)
+                    # Block until more data arrives, the channel closes or the connection times out:
+                    if not found_prompt:
+                        wait_for_data(
+                            inv_shell, self.connection_timeout - (time.time() - self.session_object_start_time))
                     timer += 1
 
                 self.session_object_interact_time = time.time()
 
+                # Close the shell (and its recording, see 'replay.py') of a failed attempt:
+                if not found_prompt and inv_shell is not None:
+                    inv_shell.close()
+
                 if found_prompt:
 
                     # Check output if it contains known errors:
+                    connection_timer.mark('prompt')
+                    self.timing = connection_timer.result()
                     self.session_object = inv_shell
-                    self.history += ssh_output
+                    self.authentication_index = auth_index
+                    remember_authentication(self, remembered)
+                    self.history_transcript.write(ssh_output)
                     self.ssh_error = None
                     logger.debug("%s: Found prompt '%s'.", logger_prefix, self.prompt['prompt'])
+
+                    # Session lost (or timed out) disabling paging: close it, callers only disconnect sessions
+                    #   that connected without an error:
+                    if not disable_paging(self):
+                        self.disconnect()
+                        self.status = 'error'
+                        return False
                     return True
 
             if ssh_error is not None:
@@ -292,15 +376,155 @@ def connect(self):
                 logger.debug("%s: Error '%s'.", logger_prefix, self.ssh_error)
 
             if stop_retries:
-                tries = self.retries
+                tries = attempts
 
             else:
                 tries += 1
 
+        # The profile remembered for this host no longer works, forget it:
+        if auth_index == remembered and self.ssh_error is not None and AUTHENTICATION_ERRORS.search(self.ssh_error):
+            forget_authentication(self)
+
+        # Error may pass (e.g.: timed out, unlike authentication failures), a later attempt could succeed. If not, and
+        #   the caller schedules the retries, they skip this profile:
+        if not stop_retries:
+            retryable = True
+        elif self.defer_retries:
+            self.failed_authentication.append(auth_index)
+
         # Reset error and tries/stop_retries for next authentication type
+        last_error = self.ssh_error
         self.ssh_error = None
         tries = 0
         stop_retries = False
 
+    # All authentication profiles failed, keep the last error:
+    self.status = 'error'
+    self.ssh_error = last_error
+
+    # Close the client and transcript files ('disconnect()' is only called for sessions that connected):
+    self.ssh_client.close()
+    self.raw_transcript.close()
+    self.history_transcript.close()
+
+    # Caller schedules the retries: ask for one if the error may pass, and retries are left (see 'retry_delay'):
+    if self.defer_retries and retryable and self.attempts < self.retries:
+        self.status = 'retry'
+
     return False
 
+
+def disable_paging(self):
+
+    """
+        Sends the device's command to disable paging ('disable_paging' in 'SSH_PROMPTS'), so long output arrives in one
+          go rather than a page per round-trip. Paging prompts are still answered (see 'SSH_AUTO_RESPONSE') if the
+          command fails, i.e.: reports an error or prints anything, or only asks programs not to page
+          ('paging_advisory', e.g.: 'PAGER' on Linux doesn't stop 'less' run directly).
+    :return: False if the session was lost (or timed out) doing so, True if not
+    """
+
+    command = self.prompt.get('disable_paging') if isinstance(self.prompt, dict) else None
+    if not self.disable_paging or command is None:
+        return True
+
+    logger_prefix = f'{self.username}@{self.host}:{self.port}'
+    if self.session_id > 0:
+        logger_prefix += f" ({self.session_id})"
+
+    output = send_command(self, command)
+    if 'time_failed' in output or 'output' not in output:
+        return False                                   # Session lost (or timed out), keep the error
+
+    if self.ssh_error is None and output['output'].strip() == '':
+        self.paging = False
+        self.answer_paging = self.prompt.get('paging_advisory', False)
+        logger.debug("%s: Paging disabled.", logger_prefix)
+    else:
+        self.ssh_error = None
+        logger.debug("%s: Unable to disable paging, answering paging prompts instead.", logger_prefix)
+    return True
+
+
+def retry_delay(self):
+
+    """
+        Time to wait before the next connection attempt: 'retry_interval', doubled after each failed attempt (up to
+          'MAX_RETRY_DELAY') with random jitter, so hosts failing together don't all retry at the same time.
+    :return: Delay (seconds)
+    """
+
+    delay = min(self.retry_interval * 2 ** max(self.attempts - 1, 0), MAX_RETRY_DELAY)
+    return delay * random.uniform(1 - RETRY_JITTER, 1)
+
+
+def authentication_key(self):
+    return f"{self.host}:{self.port}"
+
+
+def remembered_authentication(self):
+
+    # Index of the authentication profile that last worked for this host (None if not known, or no longer listed).
+    #   Profiles are remembered by position and username, never by password:
+    if not self.remember_authentication or len(self.authentication) < 2:
+        return None
+
+    learned = cached('authentication').get(authentication_key(self))
+    if learned is None:
+        return None
+
+    usernames = [auth_item.get('username') for auth_item in self.authentication]
+    index = learned.get('index')
+    if isinstance(index, int) and index < len(usernames) and usernames[index] == learned.get('username'):
+        return index
+    if usernames.count(learned.get('username')) == 1:
+        return usernames.index(learned.get('username'))
+    return None
+
+
+def authentication_order(self, remembered):
+
+    # Order to try the authentication profiles in: the remembered one first, then the others as listed:
+    order = list(range(len(self.authentication)))
+    if remembered is not None:
+        order.remove(remembered)
+        order.insert(0, remembered)
+    return order
+
+
+def remember_authentication(self, remembered):
+
+    # Remember the profile that logged in, for the next connection to this host. The first profile is tried first
+    #   anyway, so it's only stored to replace another. Written once the run completes (see 'flush_cache'):
+    if not self.remember_authentication or len(self.authentication) < 2:
+        return
+    if self.authentication_index == remembered:
+        return
+    if self.authentication_index == 0 and authentication_key(self) not in cached('authentication'):
+        return
+    update_cache('authentication', authentication_key(self), {
+        'index': self.authentication_index,
+        'username': self.username,
+        'updated': int(time.time())
+    }, defer=True)
+
+
+def forget_authentication(self):
+    logger.debug("%s@%s:%s: Remembered authentication profile failed, forgetting it.", self.username, self.host,
+                 self.port)
+    update_cache('authentication', authentication_key(self), None, defer=True)
+
+
+# Errors meaning an authentication profile does not work (rather than the host being unreachable):
+AUTHENTICATION_ERRORS = re.compile(
+    r"^(Authentication failed|Bad authentication type|User '.*?' does not have shell access)")
+
+# Channel open failures meaning the jump-host refused for lack of capacity, e.g.: sshd 'MaxSessions' or rate limits:
+CAPACITY_ERRORS = [
+    paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED,
+    paramiko.OPEN_FAILED_RESOURCE_SHORTAGE
+]
+
+# Connection retries: longest delay between attempts (seconds), and jitter (share of the delay taken off at random):
+MAX_RETRY_DELAY = 300
+RETRY_JITTER = 0.5
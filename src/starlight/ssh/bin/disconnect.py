@@ -19,16 +19,25 @@ def disconnect(self):
 
     self.session_end_time = time.time()
     self.session_object.close()
+    if self.ssh_client is not None:
+        self.ssh_client.close()                        # Closes the transport (and its thread) too
+    self.raw_transcript.close()
+    self.history_transcript.close()
     logger_prefix = f'{self.username}@{self.host}:{self.port}'
     if self.session_id > 0:
         logger_prefix += f" ({self.session_id})"
     logger.debug('%s: SSH session disconnected.', logger_prefix)
 
+    # Jump-host: remember its learned session limit for the next run:
+    if hasattr(self, 'session_manager'):
+        self.session_manager.save()
+
     if self.jump_host is not None:
         jh_logger_prefix = f'{self.jump_host.username}@{self.jump_host.host}:{self.jump_host.port}'
         if self.jump_host.session_id > 0:
             jh_logger_prefix += f" ({self.jump_host.session_id})"
-        jh_session_id = self.jump_host.session_manager.free_session(self.session_id)
+        jh_session_id = self.jump_host.session_manager.free_session(
+            self.task_id if self.task_id is not None else self.session_id)
         logger.debug("%s: Session %s freed.", jh_logger_prefix, jh_session_id)
 
     return True
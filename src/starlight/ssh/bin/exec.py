@@ -0,0 +1,214 @@
+"""
+
+    SSH Exec (exec.py): Runs commands on exec channels (SSHSession 'exec' mode), for hosts that support it (e.g.: Linux,
+      F5 bash, Opengear).
+
+    Each command runs on its own channel over the session's transport, and the commands run in parallel (up to
+      'MAX_EXEC_CHANNELS' at a time). There is no shell, so no prompt detection, paging or auto-responses: the output
+      and exit status are read directly. Commands don't share state (e.g.: 'cd' does not carry over to the next one).
+
+    If the authentication profile used has a 'sudo_command' (e.g.: 'sudo bash'), commands run through it, with 'sudo -S'
+      and a known prompt: the sudo password is sent on the channel's stdin only when sudo asks for it (not at all with
+      NOPASSWD or cached credentials). The command itself reads nothing from stdin ('/dev/null').
+
+"""
+
+import select
+import shlex
+import time
+from collections import deque
+
+import paramiko
+
+import starlight.core.logger as logger
+
+
+def exec_commands(self, commands: list):
+
+    """
+
+        Runs commands on parallel exec channels.
+
+    :param commands: List of commands
+    :return: List of output dicts (in the same order as the commands), with 'exit_status' and 'stderr' added
+    """
+
+    logger_prefix = f'{self.username}@{self.host}:{self.port}'
+    if self.session_id > 0:
+        logger_prefix += f" ({self.session_id})"
+
+    results = [None] * len(commands)
+    pending = deque(enumerate(commands))               # Commands waiting for a channel
+    running = {}                                       # Channels open, and the command running on each
+
+    transport = self.ssh_client.get_transport() if self.ssh_client is not None else None
+    if transport is None or not transport.is_active():
+        self.ssh_error = 'Connection lost'
+
+    while (len(pending) > 0 or len(running) > 0) and self.ssh_error is None:
+
+        # Open channels for waiting commands:
+        while len(pending) > 0 and len(running) < MAX_EXEC_CHANNELS:
+
+            index, command = pending[0]
+            output = {'command': command, 'time_sent': time.time()}
+            try:
+                channel = transport.open_session(timeout=self.connection_timeout)
+                channel.exec_command(exec_command_line(self, command))
+            except paramiko.ChannelException as err:
+
+                # Host limits the number of channels (e.g.: sshd 'MaxSessions'), wait for a running command to finish:
+                if len(running) > 0:
+                    break
+                pending.popleft()
+                output['time_failed'] = time.time()
+                output['ssh_error'] = f"Unable to open channel: {err.text}"
+                results[index] = output
+                continue
+            except (paramiko.SSHException, EOFError, OSError) as err:
+                self.ssh_error = str(err) if str(err) != '' else 'Connection lost'
+                break
+
+            pending.popleft()
+            logger.debug("%s: Sending command '%s'... [Exec mode]", logger_prefix, command)
+
+            # Signal end of input (commands reading stdin don't wait), unless sudo may ask for its password:
+            sudo_password = exec_sudo_password(self)
+            if sudo_password is None:
+                channel.shutdown_write()
+
+            running[channel] = {'index': index, 'output': output, 'stdout': bytearray(), 'stderr': bytearray(),
+                                'sudo_password': sudo_password, 'eof': False}
+
+        if len(running) == 0:
+            continue
+
+        # Wait for data (or end of output) on any of the channels, until the longest running command times out:
+        started = min(item['output']['time_sent'] for item in running.values())
+        remaining = self.session_object_timeout - (time.time() - started)
+        if remaining <= 0:
+            self.ssh_error = "Timed out. Command(s) did not complete."
+            break
+        reading = [channel for channel, item in running.items() if not item['eof']]
+        select.select(reading, [], [], remaining if len(reading) == len(running) else min(remaining, EXIT_STATUS_POLL))
+        self.session_object_interact_time = time.time()
+
+        for channel in list(running):
+
+            item = running[channel]
+            if 'time_first_byte' not in item['output'] and (channel.recv_ready() or channel.recv_stderr_ready()):
+                item['output']['time_first_byte'] = time.time()
+            while channel.recv_ready():
+                item['stdout'] += channel.recv(65536)
+            while channel.recv_stderr_ready():
+                item['stderr'] += channel.recv_stderr(65536)
+
+            # Sudo asked for its password (once, a wrong password then reads end of input):
+            if item['sudo_password'] is not None and SUDO_PROMPT.encode() in item['stderr']:
+                item['stderr'] = item['stderr'].replace(SUDO_PROMPT.encode(), b'', 1)
+                channel.sendall(f"{item['sudo_password']}\n")
+                channel.shutdown_write()
+                item['sudo_password'] = None
+
+            # Command complete once all of its output and its exit status have been received:
+            if channel.eof_received or channel.closed:
+                if channel.recv_ready() or channel.recv_stderr_ready():
+                    continue
+                if not channel.exit_status_ready():
+                    item['eof'] = True                 # Exit status follows (polled, see 'EXIT_STATUS_POLL')
+                    continue
+                results[item['index']] = exec_output(item, channel.recv_exit_status())
+                channel.close()
+                del running[channel]
+
+                output = results[item['index']]
+                self.raw_transcript.write(output['raw_output'])
+                self.history_transcript.write(f"{output['command']}\n{output['output']}\n")
+                logger.debug(
+                    "%s: Command '%s' completed, exit status %s. (%.2fs)", logger_prefix, output['command'],
+                    output['exit_status'], output['time_completed'] - output['time_sent'])
+
+    # Commands that did not complete (session lost or timed out):
+    for channel, item in running.items():
+        channel.close()
+        item['output']['time_failed'] = time.time()
+        item['output']['ssh_error'] = self.ssh_error
+        results[item['index']] = item['output']
+    for index, command in pending:
+        results[index] = {'command': command, 'time_failed': time.time(), 'ssh_error': self.ssh_error}
+
+    if self.ssh_error is not None:
+        logger.debug("%s: Error '%s'. [Exec mode]", logger_prefix, self.ssh_error)
+
+    return results
+
+
+def exec_output(item, exit_status):
+
+    # Build the output dict for a completed command (same keys as 'send_command', plus 'exit_status' and 'stderr'):
+    output = item['output']
+    output['time_completed'] = time.time()
+    output['exit_status'] = exit_status
+    output['raw_output'] = bytes(item['stdout'])
+    output['output'] = exec_text(item['stdout'])
+    output['stderr'] = exec_text(item['stderr'])
+    output['prompt'] = ''
+    output['error'] = None
+    return output
+
+
+def exec_text(data):
+
+    # Decode output, normalise line endings and drop the final line break:
+    text = data.decode('utf-8', 'ignore').replace('\r\n', '\n')
+    if text.endswith('\n'):
+        text = text[:-1]
+    return text
+
+
+def exec_command_line(self, command: str):
+
+    # Run the command through the authentication profile's sudo command, if it has one (e.g.: 'sudo bash' runs
+    # "sudo -S -p '<prompt>' bash -c '<command>'"), with sudo reading its password from stdin and the command not:
+    if exec_sudo_password(self) is None:
+        return command
+
+    auth_item = self.authentication[self.authentication_index]
+    script = f"{{ {command}\n}} < /dev/null"
+    args = shlex.split(auth_item['sudo_command'])
+    if len(args) == 0 or args[0] != 'sudo':
+        return f"{auth_item['sudo_command']} -c {shlex.quote(script)}"
+
+    # Sudo's own options, then the program it runs (if any, e.g.: 'bash', 'su -'), which is given the command:
+    position = 1
+    while position < len(args) and args[position].startswith('-') and args[position] != '--':
+        position += 2 if args[position] in SUDO_OPTION_ARGUMENTS else 1
+    options, program = args[1:position], args[position:]
+    if len(program) > 0 and program[0] == '--':
+        program = program[1:]
+    if len(program) == 0:
+        program = ['sh']
+    return shlex.join(['sudo', *options, '-S', '-p', SUDO_PROMPT, '--', *program, '-c', script])
+
+
+def exec_sudo_password(self):
+
+    # Sudo password of the authentication profile used to log in (None if it does not use sudo):
+    if self.authentication_index is None:
+        return None
+    auth_item = self.authentication[self.authentication_index]
+    if 'sudo_command' not in auth_item:
+        return None
+    return auth_item.get('sudo_password', '')
+
+
+# Maximum number of exec channels open at once on a session (OpenSSH 'MaxSessions' defaults to 10):
+MAX_EXEC_CHANNELS = 10
+
+# Seconds between checks for the exit status of commands whose output is complete (usually it comes first):
+EXIT_STATUS_POLL = 0.01
+
+SUDO_PROMPT = '[starlight sudo password]'
+
+# Sudo options taking an argument (e.g.: '-u root'):
+SUDO_OPTION_ARGUMENTS = ['-u', '-g', '-h', '-p', '-C', '-D', '-R', '-r', '-t', '-T', '-U']
@@ -9,22 +9,32 @@ import re
 
 def id_by_prompt(prompt_string):
 
-    # Check prompt to determine information about the host:
-    for prompt in SSH_PROMPTS:
-        # print(prompt['regex'])
-        tmp = re.search(prompt['regex'], prompt_string)
-        if tmp:
-            result = {}
-            for key in prompt.keys():
-                if key == 'extract':
-                    for item_index, item in enumerate(prompt[key]):
-                        try:
-                            result[item] = tmp.group(item_index + 1)
-                        except AttributeError:
-                            pass
-                else:
-                    result[key] = prompt[key]
-            return result
+    # Check prompt to determine information about the host (all prompt expressions are tried in a single pass):
+    tmp = PROMPT_MATCHER['regex'].search(prompt_string)
+    if tmp:
+        index, group = PROMPT_MATCHER['groups'][tmp.lastgroup]
+        prompt = SSH_PROMPTS[index]
+        result = {}
+        for key in prompt.keys():
+            if key == 'extract':
+                for item_index, item in enumerate(prompt[key]):
+                    try:
+                        result[item] = tmp.group(group + item_index + 1)
+                    except (AttributeError, IndexError):
+                        pass
+            else:
+                result[key] = prompt[key]
+        return result
+
+    return False
+
+
+def id_by_known_prompt(prompt_string, known_prompt):
+
+    # Once a session knows its prompt, checking for it needs no regular expression:
+    if isinstance(known_prompt, dict) and known_prompt.get('prompt'):
+        if prompt_string.endswith(known_prompt['prompt']):
+            return known_prompt
 
     return False
 
@@ -32,30 +42,55 @@ def id_by_prompt(prompt_string):
 def id_by_ssh_version(version_string):
 
     # Check version string to determine information about device.
-    for string in SSH_VERSIONS:
-        tmp = re.search(string['regex'], version_string)
-        if tmp:
-            result = {}
-            for key in string.keys():
-                result[key] = string[key]
-            return result
+    tmp = VERSION_MATCHER['regex'].search(version_string)
+    if tmp:
+        index, group = VERSION_MATCHER['groups'][tmp.lastgroup]
+        return SSH_VERSIONS[index].copy()
 
     return False
 
 
-def auto_reponse(prompt_string):
+def auto_reponse(prompt_string, paging: bool = True):
 
-    # Auto-respond to output configured with 'SSH_AUTO_RESPONSE'
+    # Auto-respond to output configured with 'SSH_AUTO_RESPONSE' (not to paging prompts once paging is disabled):
     response = False
-    for prompt in SSH_AUTO_RESPONSE:
-        tmp = re.search(prompt['find'], prompt_string)
-        if tmp:
-            prompt['found'] = tmp.group(0)
-            return prompt
+    tmp = AUTO_RESPONSE_MATCHER['regex'].search(prompt_string)
+    if tmp:
+        index, group = AUTO_RESPONSE_MATCHER['groups'][tmp.lastgroup]
+        if SSH_AUTO_RESPONSE[index].get('paging') and not paging:
+            return False
+        response = SSH_AUTO_RESPONSE[index].copy()
+        response['found'] = tmp.group(group)
 
     return response
 
 
+def compile_table(table, key):
+
+    """
+
+        Compiles the regular expressions of a table (e.g. 'SSH_PROMPTS') into a single expression, wrapping each entry
+          in a named group so a match can be dispatched back to its entry. Entries are tried in order at each position,
+          which gives the same result as trying them one by one for anchored ('^...') expressions.
+
+    :param table: List of dicts containing regular expressions
+    :param key: Key holding the regular expression, e.g.: 'regex'
+    :return: dict with the compiled expression ('regex') and the entry index and group number of each named group
+    """
+
+    expressions = []
+    groups = {}
+    group = 0
+    for index, entry in enumerate(table):
+        name = f"entry_{index}"
+        group += 1
+        groups[name] = (index, group)
+        expressions.append(f"(?P<{name}>{entry[key]})")
+        group += re.compile(entry[key]).groups
+
+    return {'regex': re.compile('|'.join(expressions)), 'groups': groups}
+
+
 # Identify device by SSH version
 SSH_VERSIONS = [
 {
@@ -69,7 +104,9 @@ SSH_VERSIONS = [
 
 ]
 
-# Identify properties by SSH prompt
+# Identify properties by SSH prompt ('disable_paging': command sent once the prompt is found, so long output is sent
+#   in one go rather than a page per reply, see 'SSH_AUTO_RESPONSE'. 'paging_advisory': the command only asks programs
+#   not to page, so pagers run directly, e.g.: 'less', still do and their prompts are still answered)
 SSH_PROMPTS = [
 
     # Aruba Wireless Controllers
@@ -78,6 +115,7 @@ SSH_PROMPTS = [
         'extract': ['prompt', 'hostname'],
         'vendor': 'Aruba',
         'commands': ['show version', 'show inventory'],
+        'disable_paging': 'no paging',
         'known_errors': [r'% (Invalid input detected) at \'\^\' marker\.']
     },
 
@@ -89,6 +127,9 @@ SSH_PROMPTS = [
         'os': 'linux',
         'shell': 'bash',
         'commands': ['cat /etc/os-release', 'echo $SHELL'],
+        'disable_paging': 'export PAGER=cat SYSTEMD_PAGER=cat',
+        'paging_advisory': True,
+        'batch': {'marker': "echo '{marker}'", 'separator': '; ', 'command': 'eval {command}'},
         'known_errors': [
             r'^bash: .*?: (command not found)$',
             r'^.*?: can\'t open \'.*?\': (No such file or directory)',
@@ -100,6 +141,9 @@ SSH_PROMPTS = [
         'os': 'linux',
         'shell': 'ksh',
         'commands': ['cat /etc/os-release', 'echo $SHELL'],
+        'disable_paging': 'export PAGER=cat SYSTEMD_PAGER=cat',
+        'paging_advisory': True,
+        'batch': {'marker': "echo '{marker}'", 'separator': '; ', 'command': 'eval {command}'},
         'known_errors': [
             r'^bash: .*?: (command not found)$',
             r'^.*?: can\'t open \'.*?\': (No such file or directory)',
@@ -113,6 +157,9 @@ SSH_PROMPTS = [
         'os': 'darwin',
         'shell': 'bash',
         'commands': ['cat /etc/os-release', 'echo $SHELL'],
+        'disable_paging': 'export PAGER=cat SYSTEMD_PAGER=cat',
+        'paging_advisory': True,
+        'batch': {'marker': "echo '{marker}'", 'separator': '; ', 'command': 'eval {command}'},
         'known_errors': [
             r'^bash: .*?: (command not found)$',
             r'^.*?: can\'t open \'.*?\': (No such file or directory)',
@@ -125,6 +172,7 @@ SSH_PROMPTS = [
         'extract': ['prompt', 'username', 'hostname'],
         'vendor': 'f5',
         'commands': ['show sys version', 'show sys hardware', 'show info'],
+        'disable_paging': 'modify cli preference pager disabled',
         'known_errors': []
     },
 
@@ -134,22 +182,26 @@ SSH_PROMPTS = [
         'extract': ['prompt', 'hostname', 'mode'],
         'vendor': 'arista|cisco',
         'commands': ['show version'],
+        'disable_paging': 'terminal length 0',
+        'batch': {'marker': '! {marker}'},
         'known_errors': []
     },
 
     # User '.*?' does not have shell access on this device  (Opengear)
 ]
 
-# Console activity to auto-respond to
+# Console activity to auto-respond to ('paging': paging prompt, not expected once paging is disabled)
 SSH_AUTO_RESPONSE = [
     {
         'find': r'^--More-- \(q\) quit \(u\) pageup \(/\) search \(n\) repeat $',
         'reply_with': ' ',
+        'paging': True,
         'clean': r'--More-- \(q\) quit \(u\) pageup \(/\) search \(n\) repeat\s{51}'
     },
     {
         'find': r'^ --More-- $',
         'reply_with': ' ',
+        'paging': True,
         'clean': r' --More-- (\x08){9}\s+(\x08){8}'
     },
     {
@@ -159,13 +211,21 @@ SSH_AUTO_RESPONSE = [
     {
         'find': r'^---\(less\s+\d+%\)---$',
         'reply_with': ' ',
+        'paging': True,
     },
     {
         'find': r'^lines \d+-\d+ |lines \d+-\d+/\d+ \(END\) $',
         'reply_with': ' ',
+        'paging': True,
     },
     {
         'find': r'^\(END\)$',
         'reply_with': 'q',
+        'paging': True,
     },
 ]
+
+# Compile tables once (at import):
+VERSION_MATCHER = compile_table(SSH_VERSIONS, 'regex')
+PROMPT_MATCHER = compile_table(SSH_PROMPTS, 'regex')
+AUTO_RESPONSE_MATCHER = compile_table(SSH_AUTO_RESPONSE, 'find')
@@ -1,10 +1,64 @@
+"""
+
+    SSH Interaction (interaction.py): Runs a list of tasks against hosts, directly or via jump-hosts.
+
+    Tasks are dispatched onto a fixed pool of worker threads through a blocking work queue. Workers report back on a
+      completion queue, which wakes the dispatcher to free the session slot and hand out the next task, so no thread
+      polls and the number of threads does not depend on the number of tasks.
+
+    Sessions via a jump-host are limited by its session manager, which adapts the limit to how the jump-host copes
+      (see 'SessionManager.record_open'). Tasks refused by a busy jump-host are queued again rather than failed.
+
+    Failed connection attempts (e.g.: host unreachable) are not retried by the worker: the task frees its session slot
+      and waits on a retry queue until its next attempt is due (see 'retry_delay'), so hosts that are down don't hold
+      up the others. Authentication profiles that failed for good (e.g.: wrong password) aren't retried.
+
+    Host names are resolved up front, all at once (see 'resolver.py'), and with 'probe' all hosts are checked for TCP
+      reachability too (see 'probe.py'). Tasks for hosts that don't resolve or can't be reached fail without taking a
+      session slot.
+
+    Tasks can be limited further by named concurrency pools, keyed by any task item (e.g.: at most 20 sessions per
+      site, see 'limits.py'). Tasks held back by a pool wait on it, so they don't hold up the others.
+
+    Queued tasks run by 'priority', then 'deadline' (see 'task_queue.py'). Tasks whose deadline passes while queued
+      fail without taking a session slot.
+
+"""
+
+import heapq
+import inspect
+import itertools
+import queue
+import threading
 import time
+
+from starlight.core.cache import flush_cache
 from starlight.core.logger import logger
+from .connect import retry_delay
+from .limits import ConcurrencyLimits
+from .pool import ConnectionPool
+from .probe import run_preflight
 from .session import SSHSession, SessionManager
-import threading
-from pprint import pprint
 
-def interaction(tasks):
+
+def interaction(
+        tasks, workers: int = None, pool: ConnectionPool = None, probe: bool = False, probe_timeout: float = 2,
+        resolve: bool = True, limits: list = None):
+
+    """
+
+        Runs tasks (dicts of 'SSHSession' arguments, optionally with 'connect_via' holding the jump-host arguments).
+          Each task is updated with its 'status', 'error' and command 'results' once complete.
+
+    :param tasks: List of tasks
+    :param workers: Number of worker threads (defaults to the number of session slots available)
+    :param pool: Connection pool to take connected sessions from, and keep them in once done (e.g.: 'connection_pool')
+    :param probe: Check which hosts (or their jump-hosts) are reachable before connecting
+    :param probe_timeout: Time to wait for hosts to accept a TCP connection when probing (seconds)
+    :param resolve: Resolve host names before connecting (sessions use the addresses cached, see 'resolver.py')
+    :param limits: Concurrency pools limiting the tasks ('ConcurrencyPool' objects or their arguments, see 'limits.py')
+    :return: List of tasks
+    """
 
     global jump_hosts
     global dsm
@@ -12,10 +66,28 @@ def interaction(tasks):
     logger.info('Starting...')
     st = time.time()
 
+    # Hosts that don't resolve (or, if probing, don't accept TCP connections). Tasks for these fail straight away:
+    unreachable = run_preflight(tasks, resolve, probe, probe_timeout)
+
+    work = queue.Queue()                               # Jobs ready to run (session slot allocated)
+    completed = queue.Queue()                          # Jobs completed by workers (wakes the dispatcher)
+    outstanding = 0                                    # Jobs queued, running or waiting to be retried
+    retrying = []                                      # Jobs waiting to be retried: heap of (time due, order, job)
+    order = itertools.count()
+    limits = limits if isinstance(limits, ConcurrencyLimits) else ConcurrencyLimits(limits)
+
     for task_id, task in enumerate(tasks):
 
+        task['task_id'] = task_id + 1
+        limits.register(task)
         jump_host = task.get('connect_via', None)
 
+        # Tasks a concurrency pool allows none of can't run:
+        if (closed := limits.closed(task)) is not None:
+            task['status'] = 'error'
+            task['error'] = f"Concurrency pool '{closed.name}' allows no tasks for '{closed.value(task)}'"
+            continue
+
         # Jump-host
         if jump_host is not None:
 
@@ -24,141 +96,273 @@ def interaction(tasks):
                 task['error'] = 'No host specified'
             if jump_host.get('authentication', None) is None:
                 task['error'] = 'No authentication credentials specified'
-
-            if task['error'] is None:
-
-                del task['error']
-                # Check if jump-host is already registered in the jump_hosts list, and if not - register it:
-                if jump_host['host'] not in jump_hosts:
+            if (jump_host.get('host'), jump_host.get('port', 22)) in unreachable:
+                task['error'] = f"Jump host '{jump_host['host']}' unavailable: " \
+                                f"{unreachable[(jump_host['host'], jump_host.get('port', 22))]}"
+
+            if task['error'] is not None:
+                task['status'] = 'error'
+                continue
+
+            del task['error']
+
+            # Check if jump-host is already registered in the jump_hosts list, and if not - register and connect it:
+            jh_key = f"{jump_host['host']}:{jump_host.get('port', 22)}"
+            if jh_key not in jump_hosts:
+                pooled = pool.checkout(jump_host['host'], jump_host.get('port', 22), jump_host['authentication'],
+                                       is_jump_host=True) if pool is not None else None
+                if pooled is not None:
+                    jump_hosts[jh_key] = pooled
+                else:
                     jump_host['is_jump_host'] = True
-                    jump_hosts[jump_host['host']] = jump_host.copy()
-                    threader = threading.Thread(target=ssh_worker, args=(jump_host,))
-                    threader.daemon = True
-                    threader.start()
+                    jump_hosts[jh_key] = SSHSession(**session_arguments(jump_host))
+                    jump_hosts[jh_key].defer_retries = True
+                    work.put(('jump_host', jump_hosts[jh_key]))
+                    outstanding += 1
 
-                # Add task (without the jump-host information) to queue:
-                jh_task = task
-                jh_task['task_id'] = task_id + 1
-                del jh_task['connect_via']
-                jump_hosts[jump_host['host']]['session'].session_manager.queue.append(jh_task)
+            # Add task to the jump-host's queue (the task's 'connect_via' is left as given):
+            task_jump_hosts[task['task_id']] = jump_hosts[jh_key]
+            jump_hosts[jh_key].session_manager.queue.push(task)
 
         # Direct
         else:
 
-            # Get session for next task (if available):
-            session_id = dsm.get_next_available_session(session_id=task_id + 1)
-            task['task_id'] = task_id + 1
-            if session_id > 0:
-                threader = threading.Thread(target=ssh_worker, args=(task,))
-                threader.daemon = True
-                threader.start()
+            if (task.get('host'), task.get('port', 22)) in unreachable:
+                task['status'] = 'error'
+                task['error'] = unreachable[(task.get('host'), task.get('port', 22))]
+                continue
+
+            dsm.queue.push(task)
+
+        outstanding += 1
+
+    # Start workers:
+    if workers is None:
+        workers = dsm.max_sessions + sum(jh.session_manager.cap + 1 for jh in jump_hosts.values())
+    threads = []
+    for _ in range(max(workers, 1)):
+        threader = threading.Thread(target=worker, args=(work, completed, pool))
+        threader.daemon = True
+        threader.start()
+        threads.append(threader)
+
+    # Dispatch tasks to free session slots, then wait for jobs to complete:
+    while outstanding > 0:
+
+        # Tasks whose deadline passed while queued are dropped:
+        expired = dispatch(work, limits)
+        if len(expired) > 0:
+            for task in expired:
+                task['status'] = 'error'
+                task['error'] = 'Deadline passed before the task could run'
+                for woken in limits.release(task):
+                    queue_task(woken, front=True)
+            outstanding -= len(expired)
+            continue
+
+        # Wait for a job to complete, or for the next retry to be due:
+        try:
+            job = completed.get(timeout=max(retrying[0][0] - time.time(), 0) if len(retrying) > 0 else None)
+        except queue.Empty:
+            while len(retrying) > 0 and retrying[0][0] <= time.time():
+                kind, item = heapq.heappop(retrying)[2]
+                if kind == 'jump_host':
+                    work.put((kind, item))
+                else:
+                    queue_task(item)
+            continue
+
+        kind, item = job
+        outstanding -= 1
+
+        # Connection failed but may work later: retry once due, the session slot is free in the meantime:
+        status = item.status if kind == 'jump_host' else item['status']
+        if status == 'retry':
+            delay = retry_delay(item) if kind == 'jump_host' else item['retry_delay']
+            heapq.heappush(retrying, (time.time() + delay, next(order), job))
+            outstanding += 1
+
+        if kind == 'jump_host':
+
+            # Tasks waiting on a jump-host that failed to connect (queued, or held back by a pool) can't run:
+            if item.status not in ['connected', 'retry']:
+                failed = [task for task in limits.parked() if task_jump_hosts.get(task['task_id']) is item]
+                for task in failed:
+                    limits.unpark(task)
+                for task in item.session_manager.queue.drain() + failed:
+                    task['status'] = 'error'
+                    task['error'] = f"Jump host '{item.host}' unavailable: {item.ssh_error}"
+                    outstanding -= 1
+                    for woken in limits.release(task):
+                        queue_task(woken, front=True)
 
-            else:
-                dsm.queue.append(task)
+        else:
 
-    while True:
+            # Free the session slot used by the task:
+            session_manager(item).release(item['task_id'])
 
-        # Process jobs executing via jump-hosts:
-        for jh in jump_hosts:
-            if isinstance(jump_hosts[jh], SSHSession):
-                # If sessions are free, assign a task from the queue to that session:
-                if jump_hosts[jh].session_manager.current_sessions < jump_hosts[jh].session_manager.max_sessions:
-                    if len(jump_hosts[jh].session_manager.queue) > 0:
-                        task = jump_hosts[jh].session_manager.queue.pop(0)
-                        session_id = jump_hosts[jh].session_manager.get_next_available_session(
-                            session_id=task['task_id'])
-
-                        if session_id > 0:
-                            threader = threading.Thread(target=ssh_worker, args=(task,))
-                            threader.daemon = True
-                            threader.start()
-
-                    # Disconnect from jump-host if all jobs are done!
-                    if jump_hosts[jh].session_manager.current_sessions == 0:
-                        if len(jump_hosts[jh].session_manager.queue) == 0:
-                            if jump_hosts[jh].status != 'disconnected':
-                                jump_hosts[jh].disconnect()
-                                jump_hosts[jh].status = 'disconnected'
-
-        # Process direct sessions:
-        if dsm.current_sessions < dsm.max_sessions:
-            if len(dsm.queue) > 0:
-                task = dsm.queue.pop(0)
-                session_id = dsm.get_next_available_session(session_id=task['task_id'])
-                if session_id > 0:
-                    threader = threading.Thread(target=ssh_worker, args=(task,))
-                    threader.daemon = True
-                    threader.start()
-
-            # Work out if all tasks are complete (direct and via jump-hosts):
-            elif len(dsm.queue) == 0 and dsm.current_sessions == 0:
-
-                all_done = False
-                jh_done = 0
-                for jh in jump_hosts:
-                    if isinstance(jump_hosts[jh], SSHSession):
-                        if jump_hosts[jh].status == 'disconnected':
-                            jh_done += 1
-
-                if jh_done == len(jump_hosts):
-                    all_done = True
-
-                if all_done:
-                    logger.info(f'Completed! ({int(100*(time.time() - st))/100}s)')
-                    break
-
-        time.sleep(0.01)
-
-
-def ssh_worker(session):
+            # And its place in its concurrency pools, letting a task held back by them run:
+            for task in limits.release(item):
+                queue_task(task, front=True)
 
-    global jump_hosts
-    global dsm
+            # Jump-host was busy: queue the task again, it runs once the (reduced) session limit allows:
+            if item['status'] == 'throttled':
+                item['throttled'] = item.get('throttled', 0) + 1
+                if item['throttled'] <= max_throttled:
+                    queue_task(item, front=True)
+                    outstanding += 1
+                else:
+                    item['status'] = 'error'
 
-    #  Determine if this is a jump-host
-    is_jump_host = False
-    if session.get('host') in jump_hosts:
-        is_jump_host = True
+        # Disconnect from jump-hosts once all of their tasks are done, held back or waiting to retry included
+        # (or keep them in the pool):
+        waiting = limits.parked() + [entry[2][1] for entry in retrying if entry[2][0] == 'task']
+        for jh in jump_hosts.values():
+            if jh.status == 'connected' and pool is None:
+                if len(jh.session_manager.queue) == 0 and jh.session_manager.current_sessions == 0 \
+                        and not any(task_jump_hosts.get(task['task_id']) is jh for task in waiting):
+                    jh.disconnect()
+                    jh.status = 'disconnected'
 
-    s = SSHSession(**session)
-    if is_jump_host:
-        jump_hosts[s.host]['session'] = s
+    # Stop workers:
+    for _ in threads:
+        work.put(None)
+    for threader in threads:
+        threader.join()
+    if pool is not None:
+        for jh in jump_hosts.values():
+            if jh.status == 'connected' and not pool.checkin(jh):
+                jh.disconnect()
+    jump_hosts.clear()
+    task_jump_hosts.clear()
 
-    s.connect()
+    # Write what was learned (e.g.: authentication profiles) once, rather than per session:
+    flush_cache()
+
+    logger.info(f'Completed! ({int(100*(time.time() - st))/100}s)')
+
+    return tasks
+
+
+def dispatch(work, limits: ConcurrencyLimits):
+
+    # Hand out queued tasks while session slots are free (direct and via connected jump-hosts), returning those whose
+    # deadline passed. Tasks held back by a concurrency pool wait on it (see 'ConcurrencyLimits.release'):
+    managers = [dsm]
+    for jh in jump_hosts.values():
+        if jh.status == 'connected':
+            managers.append(jh.session_manager)
+
+    expired = []
+    for manager in managers:
+        while (task := manager.queue.peek()) is not None:
+            pool = limits.blocking(task)
+            if pool is not None:
+                for woken in limits.park(manager.queue.pop(), pool):
+                    queue_task(woken, front=True)
+                continue
+            if manager.acquire(task['task_id'], blocking=False) == 0:
+                break
+            manager.queue.pop()
+            limits.acquire(task)
+            work.put(('task', task))
+        expired += manager.queue.expired
+        manager.queue.expired = []
+
+    return expired
+
+
+def queue_task(task, front: bool = False):
+
+    # Queue a task again, on its jump-host's session manager (or the direct one):
+    session_manager(task).queue.push(task, front)
 
-    if s.status == 'connected':
 
-        # If this is a jump-host session and it's status is 'connected', we can use it to connect to other hosts:
-        if is_jump_host:
-            jump_hosts[s.host] = s  # Register that the jump-host is now 'connected'
+def session_manager(task):
+
+    # Session manager of the task's jump-host (or the direct one):
+    jump_host = task_jump_hosts.get(task.get('task_id'))
+    return jump_host.session_manager if jump_host is not None else dsm
+
+
+def worker(work, completed, pool=None):
+
+    # Run jobs from the work queue until told to stop (None):
+    while True:
+
+        job = work.get()
+        if job is None:
             return
 
-        # Normal hosts:
+        kind, item = job
+        try:
+            if kind == 'jump_host':
+                item.connect()
+            else:
+                ssh_worker(item, pool)
+        except Exception as err:
+            logger.error("Unexpected error running %s '%s': %s", kind.replace('_', '-'), item.get('host')
+                         if isinstance(item, dict) else item.host, err)
+            if isinstance(item, dict):
+                item['status'] = 'error'
+                item['error'] = str(err)
+
+        completed.put(job)
+
+
+def ssh_worker(session, pool=None):
+
+    # Connect to the host (or take a connected session from the pool) and run the task's commands:
+    s = None
+    if pool is not None:
+        s = pool.checkout(session['host'], session.get('port', 22), session['authentication'],
+                          task_jump_hosts.get(session.get('task_id')))
+    pooled = s is not None
+    if s is None:
+        s = SSHSession(**session_arguments(session, task_jump_hosts.get(session.get('task_id'))))
+        s.defer_retries = True
+        s.attempts = session.get('attempts', 0)
+        s.failed_authentication = session.get('failed_authentication', [])
+        s.connect()
+        session['attempts'] = s.attempts
+        session['failed_authentication'] = s.failed_authentication
+        if s.status == 'retry':
+            session['retry_delay'] = retry_delay(s)
+    else:
+        commands = session.get('command_list') or []
+        s.command_list = [commands] if isinstance(commands, str) else commands
+
+    results = []
+    if s.status == 'connected':
+
         if s.ssh_error is None:
-            for command in s.command_list:
-                if s.ssh_error is None:  # Check for errors. If error is not found, execute command
-                    result = s.send_command(command)
-            s.disconnect()
+            results = s.send_commands(s.command_list)
+            if pool is None or not pool.checkin(s):
+                s.disconnect()
+
+    session['status'] = 'error' if s.ssh_error is not None and s.status not in ['throttled', 'retry'] else s.status
+    session['error'] = s.ssh_error
+    session['results'] = results
+    session['timing'] = {} if pooled else s.timing                # Connection timing (none for pooled sessions)
+
+    return s
+
 
-    if s.ssh_error is None and s.status == 'connected':
-        pass
+def session_arguments(task, jump_host=None):
 
-    # Clear session once complete
-    for jh in jump_hosts:
-        if isinstance(jump_hosts[jh], SSHSession):
-            for session in jump_hosts[jh].session_manager.sessions:
-                if jump_hosts[jh].session_manager.sessions[session].get('id') == s.task_id:
-                    jump_hosts[jh].session_manager.sessions[session] = {
-                        'activity': None, 'id': None, 'status': 'idle'}
-                    jump_hosts[jh].session_manager.current_sessions -= 1
+    # Only pass on task items 'SSHSession' accepts (tasks may carry other information, e.g.: 'parameters'), connecting
+    #   via the jump-host's session (if any) rather than the jump-host's arguments in 'connect_via':
+    arguments = {key: value for key, value in task.items() if key in SESSION_ARGUMENTS and key != 'connect_via'}
+    if jump_host is not None:
+        arguments['connect_via'] = jump_host
+    return arguments
 
-    for session in dsm.sessions:
-        if dsm.sessions[session].get('id') == s.task_id:
-            dsm.sessions[session] = {'activity': None, 'id': None, 'status': 'idle'}
-            dsm.current_sessions -= 1
 
+SESSION_ARGUMENTS = set(inspect.signature(SSHSession.__init__).parameters) - {'self'}
 
 jump_hosts = {}  # List of active jump-hosts.
+task_jump_hosts = {}  # Jump-host (SSHSession) each task connects via: task id -> session
 
 max_direct_sessions = 10
+max_throttled = 10  # Number of times a task is queued again when its jump-host is busy, before giving up.
 dsm = SessionManager(max_sessions=max_direct_sessions)  # Direct session manager
@@ -0,0 +1,197 @@
+"""
+
+    SSH Limits (limits.py): Named concurrency pools, capping the number of tasks running at once that share an attribute
+      (e.g.: at most 20 sessions into a low-bandwidth site, or 50 authenticating against one TACACS server), on top of
+      the direct and per jump-host session limits. Global concurrency can then be raised without overloading fragile
+      sites.
+
+    A pool is keyed by the path to a task item, dotted for nested items (e.g.: 'parameters.netbox_region', or
+      'connect_via.region' for the jump-host's). Each value of the key has its own count, limited by 'limit' (or by its
+      own limit in 'limits'). Tasks without the item aren't limited by the pool.
+
+    Tasks held back by a pool wait on it rather than in the session queue, so they don't hold up tasks for other sites.
+      Each time a task with the same value completes, its place is handed to the first task waiting (so tasks arriving
+      meanwhile can't take it). Tasks whose pool has a limit of 0 can't run at all, and fail (see 'closed').
+
+    Example:
+
+        limits = [
+            ConcurrencyPool('site', 'parameters.netbox_site', limit=50, limits={'lon-edge-03': 20}),
+            ConcurrencyPool('tacacs', 'parameters.tacacs_server', limit=50),
+        ]
+        interaction(tasks, limits=limits)
+
+"""
+
+from collections import deque
+
+
+class ConcurrencyPool:
+
+    """
+        ConcurrencyPool
+    """
+
+    def __init__(self, name: str, key: str, limit: int, limits: dict = None):
+
+        self.name = name                               # Name of the pool
+        self.key = key                                 # Path to the task item (dotted)
+        self.limit = limit                             # Maximum number of tasks running at once, per value
+        self.limits = limits or {}                     # Values with a limit of their own: value -> limit
+        self.running = {}                              # Tasks running (or places handed to them): value -> count
+        self.waiting = {}                              # Tasks (or their waiters) held back: value -> deque of (task id,
+                                                       #   task or waiter)
+
+    def __repr__(self):
+        return f"ConcurrencyPool_{self.name}"
+
+    def value(self, task: dict):
+
+        # Value of the pool's key for a task (None if the task doesn't have it):
+        value = task
+        for name in self.key.split('.'):
+            value = value.get(name) if isinstance(value, dict) else getattr(value, name, None)
+            if value is None:
+                return None
+        return value
+
+    def limit_for(self, value):
+        return self.limits.get(value, self.limit)
+
+    def available(self, value):
+        return self.running.get(value, 0) < self.limit_for(value)
+
+
+class ConcurrencyLimits:
+
+    """
+        Concurrency pools a run is limited by (not thread-safe: used by the dispatcher, or on the event loop, only).
+    """
+
+    def __init__(self, pools=None):
+
+        self.pools = [ConcurrencyPool(**pool) if isinstance(pool, dict) else pool for pool in pools or []]
+        self.values = {}                               # Pools limiting each task: task id -> [(pool, value)]
+        self.holding = set()                           # Ids of the tasks running (counted in their pools)
+        self.reserved = {}                             # Places handed to tasks woken (see 'release'): task id -> [pool]
+
+    def __len__(self):
+        return len(self.pools)
+
+    def __repr__(self):
+        return f"ConcurrencyLimits_{len(self)}"
+
+    def register(self, task: dict):
+
+        """
+            Finds the pools limiting a task.
+        :param task: Task, with its 'task_id'
+        """
+
+        values = [(pool, pool.value(task)) for pool in self.pools]
+        values = [(pool, value) for pool, value in values if value is not None]
+        if len(values) > 0:
+            self.values[task['task_id']] = values
+
+    def closed(self, task: dict):
+
+        """
+            Finds a pool the task can never run in (its limit for the task is 0).
+        :param task: Task (see 'register' first)
+        :return: Pool, or None
+        """
+
+        for pool, value in self.values.get(task['task_id'], []):
+            if pool.limit_for(value) <= 0:
+                return pool
+        return None
+
+    def blocking(self, task: dict):
+
+        """
+            Finds a pool holding a task back.
+        :param task: Task
+        :return: Pool at its limit for the task, or None if the task can run
+        """
+
+        reserved = self.reserved.get(task['task_id'], [])
+        for pool, value in self.values.get(task['task_id'], []):
+            if pool not in reserved and not pool.available(value):
+                return pool
+        return None
+
+    def acquire(self, task: dict):
+
+        # Count the task in each of its pools (see 'blocking' first), but for places already handed to it:
+        if task['task_id'] in self.values and task['task_id'] not in self.holding:
+            self.holding.add(task['task_id'])
+            reserved = self.reserved.pop(task['task_id'], [])
+            for pool, value in self.values[task['task_id']]:
+                if pool not in reserved:
+                    pool.running[value] = pool.running.get(value, 0) + 1
+
+    def park(self, task: dict, pool: ConcurrencyPool, waiter=None):
+
+        """
+            Holds a task back until a place in the pool is handed to it (see 'release'). Places already handed to the
+              task in its other pools are passed on meanwhile, so it doesn't hold places it can't use yet.
+        :param task: Task
+        :param pool: Pool holding the task back (see 'blocking')
+        :param waiter: Item woken in the task's place (e.g.: a future), defaults to the task
+        :return: Tasks (or waiters) woken, places passed on to them
+        """
+
+        values = dict(self.values[task['task_id']])
+        woken = [self.free(other, values[other]) for other in self.reserved.pop(task['task_id'], [])]
+        pool.waiting.setdefault(values[pool], deque()).append((task['task_id'], task if waiter is None else waiter))
+        return [item for item in woken if item is not None]
+
+    def parked(self):
+
+        # Tasks (or their waiters) held back, in all pools:
+        return [item for pool in self.pools for waiting in pool.waiting.values() for _, item in waiting]
+
+    def unpark(self, task: dict):
+
+        # Stop holding a task back (e.g.: its jump-host failed), see 'release' for places handed to it:
+        for pool, value in self.values.get(task['task_id'], []):
+            waiting = pool.waiting.get(value)
+            if waiting:
+                pool.waiting[value] = deque((task_id, item) for task_id, item in waiting if task_id != task['task_id'])
+                if len(pool.waiting[value]) == 0:
+                    del pool.waiting[value]
+
+    def release(self, task: dict):
+
+        """
+            Frees a task's place in each of its pools (or the places handed to it, if it didn't run).
+        :param task: Task
+        :return: Tasks (or waiters) woken, places handed to them (at most one per pool): to be queued again, they may
+                   still be held back by another
+        """
+
+        if task['task_id'] in self.holding:
+            self.holding.discard(task['task_id'])
+            pools = [pool for pool, _ in self.values[task['task_id']]]
+        else:
+            pools = self.reserved.pop(task['task_id'], [])
+
+        values = dict(self.values.get(task['task_id'], []))
+        woken = [self.free(pool, values[pool]) for pool in pools]
+        return [item for item in woken if item is not None]
+
+    def free(self, pool: ConcurrencyPool, value):
+
+        # Free a place in a pool, handing it to the first task waiting for it (it stays counted), if any:
+        waiting = pool.waiting.get(value)
+        if not waiting:
+            pool.running[value] -= 1
+            if pool.running[value] == 0:
+                del pool.running[value]
+            return None
+
+        task_id, item = waiting.popleft()
+        if len(waiting) == 0:
+            del pool.waiting[value]
+        self.reserved.setdefault(task_id, []).append(pool)
+        return item
@@ -0,0 +1,188 @@
+"""
+
+    SSH Connection Pool (pool.py): Keeps connected (authenticated, prompt found) sessions open between 'interaction()'
+      runs, so polling the same hosts again only costs the time taken by the commands.
+
+    Idle sessions are kept alive by a background thread (see 'SSHSession.send_keepalive'), and disconnected once idle
+      for longer than 'idle_timeout'. Sessions are used by one task at a time: 'checkout' takes a session out of the
+      pool and 'checkin' returns it.
+
+    Example:
+
+        interaction(tasks, pool=connection_pool)     # Connects, and keeps the sessions in the pool
+        interaction(tasks, pool=connection_pool)     # Re-uses the sessions
+
+"""
+
+import threading
+import time
+
+from starlight.core.logger import logger
+
+
+class ConnectionPool:
+
+    """
+        ConnectionPool
+    """
+
+    def __init__(self, idle_timeout: int = 900, keepalive_interval: int = 60):
+
+        self.idle_timeout = idle_timeout               # Disconnect sessions idle for longer than this (seconds)
+        self.keepalive_interval = keepalive_interval   # Check idle sessions (and send keepalives) every n seconds
+        self.idle = {}                                 # Sessions in the pool: key -> list of (session, time checked in)
+        self.lock = threading.Lock()                   # Guards 'idle'
+        self.stop_event = threading.Event()            # Stops the keepalive thread
+        self.keepalive_thread = None                   # Keepalive thread (started by the first 'checkin')
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(sessions) for sessions in self.idle.values())
+
+    def __repr__(self):
+        return f"ConnectionPool_{len(self)}"
+
+    def checkout(
+            self, host: str, port: int = 22, authentication: list | dict = None, connect_via=None,
+            is_jump_host: bool = False):
+
+        """
+            Takes a connected session to a host out of the pool.
+        :param host: Name or IP address of host
+        :param port: SSH port
+        :param authentication: Authentication profile(s) - only sessions logged in with one of their usernames are used
+        :param connect_via: Jump-host (SSHSession object) the session must be connected via, or None if direct
+        :param is_jump_host: Take a jump-host session (with its session manager)
+        :return: SSHSession object, or None if there is no (working) session in the pool
+        """
+
+        if isinstance(authentication, dict):
+            authentication = [authentication]
+        usernames = [auth_item.get('username') for auth_item in authentication or []]
+        key = pool_key(host, port, connect_via, is_jump_host)
+
+        while True:
+
+            session = None
+            with self.lock:
+                sessions = self.idle.get(key, [])
+                for index in range(len(sessions) - 1, -1, -1):     # Most recently used first
+                    if len(usernames) == 0 or sessions[index][0].username in usernames:
+                        session = sessions.pop(index)[0]
+                        break
+
+            if session is None:
+                return None
+
+            if session.is_alive():
+                logger.debug("%s: Session taken from pool.", key)
+                return session
+
+            self.evict(session)
+
+    def checkin(self, session):
+
+        """
+            Returns a connected session to the pool.
+        :param session: SSHSession object
+        :return: True if the session was added to the pool, False if it is no longer working (disconnect it)
+        """
+
+        if not session.is_alive() or session.ssh_error is not None:
+            return False
+
+        with self.lock:
+            self.idle.setdefault(session_key(session), []).append((session, time.time()))
+
+            if self.keepalive_thread is None or not self.keepalive_thread.is_alive():
+                self.stop_event.clear()
+                self.keepalive_thread = threading.Thread(target=self.run, daemon=True)
+                self.keepalive_thread.start()
+
+        return True
+
+    def run(self):
+
+        # Keepalive thread: check the idle sessions until the pool is closed:
+        while not self.stop_event.wait(self.keepalive_interval):
+            self.maintain()
+
+    def maintain(self):
+
+        """
+            Disconnects sessions idle for longer than 'idle_timeout' (or no longer working), and sends keepalives on
+              sessions that have been quiet for their 'keepalive_interval'. Sessions are taken out of the pool while
+              being checked, so they are never used by a task at the same time.
+        """
+
+        now = time.time()
+        checking = []
+        with self.lock:
+            for key, sessions in self.idle.items():
+                waiting = []
+                for session, since in sessions:
+                    if now - since > self.idle_timeout or \
+                            now - session.session_object_interact_time > session.keepalive_interval or \
+                            (session.jump_host is not None and not session.jump_host.is_alive()):
+                        checking.append((session, since))
+                    else:
+                        waiting.append((session, since))
+                self.idle[key] = waiting
+
+        keep = []
+        for session, since in checking:
+            if now - since > self.idle_timeout:
+                logger.debug("%s: Idle for %ss, disconnecting.", session_key(session), int(now - since))
+                self.evict(session)
+            elif session.jump_host is not None and not session.jump_host.is_alive():
+                self.evict(session)
+            elif session.send_keepalive():
+                keep.append((session, since))
+            else:
+                self.evict(session)
+
+        with self.lock:
+            for session, since in keep:
+                self.idle.setdefault(session_key(session), []).append((session, since))
+
+    def evict(self, session):
+
+        # Disconnect a session removed from the pool (ignoring errors, it may have been closed by the host already):
+        try:
+            session.disconnect()
+        except Exception as err:
+            logger.debug("%s: Error disconnecting: %s", session_key(session), err)
+        session.status = 'disconnected'
+
+    def close(self):
+
+        """
+            Stops the keepalive thread and disconnects all sessions in the pool (sessions via jump-hosts first).
+        """
+
+        self.stop_event.set()
+        with self.lock:
+            sessions = [item[0] for sessions in self.idle.values() for item in sessions]
+            self.idle = {}
+
+        for session in sorted(sessions, key=lambda item: item.jump_host is None):
+            self.evict(session)
+
+
+def pool_key(host: str, port: int = 22, connect_via=None, is_jump_host: bool = False):
+
+    # Sessions are pooled by host, port and the jump-host used (if any). Jump-hosts are kept apart from sessions to the
+    #   same host, as tasks can't share them:
+    key = f"{host}:{port}"
+    if connect_via is not None:
+        key += f" via {connect_via.host}:{connect_via.port}"
+    if is_jump_host:
+        key += " (jump-host)"
+    return key
+
+
+def session_key(session):
+    return pool_key(session.host, session.port, session.jump_host, hasattr(session, 'session_manager'))
+
+
+connection_pool = ConnectionPool()  # Process-wide pool
@@ -0,0 +1,147 @@
+"""
+
+    SSH Probe (probe.py): Checks which hosts accept TCP connections on their SSH port, concurrently and with a short
+      timeout, before any SSH session is set up ('interaction(probe=True)').
+
+    An unreachable host otherwise costs a session slot (and a worker) for its full 'connection_timeout', for each
+      retry. Probing thousands of hosts at once costs about one 'probe_timeout' in total. Only errors meaning the host
+      can't be reached count: the connection is closed as soon as it opens, nothing is sent.
+
+    'preflight' runs the checks 'interaction()' makes before connecting: resolving host names (see 'resolver.py'), then
+      probing (if asked to).
+
+    Example:
+
+        unreachable = asyncio.run(probe_hosts([('10.0.0.1', 22), ('10.0.0.2', 22)]))
+
+"""
+
+import asyncio
+import errno
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import paramiko
+
+from starlight.core.logger import logger
+from .resolver import resolver
+
+
+async def probe_hosts(targets, timeout: float = 2, concurrency: int = 1000):
+
+    """
+        Probes TCP reachability of hosts.
+    :param targets: List of (host, port) tuples (duplicates are only probed once)
+    :param timeout: Time to wait for each connection (seconds)
+    :param concurrency: Maximum number of connections being opened at any one time
+    :return: dict of {(host, port): error} for unreachable hosts
+    """
+
+    st = time.time()
+    targets = list(dict.fromkeys(targets))
+    semaphore = asyncio.Semaphore(concurrency)
+    await resolver.resolve_all([host for host, _ in targets])
+
+    async def probe(host, port):
+        async with semaphore:
+            return await probe_host(host, port, timeout)
+
+    errors = await asyncio.gather(*[probe(host, port) for host, port in targets])
+    unreachable = {target: error for target, error in zip(targets, errors) if error is not None}
+
+    logger.debug("Probed %s hosts, %s unreachable. (%.2fs)", len(targets), len(unreachable), time.time() - st)
+
+    return unreachable
+
+
+async def probe_host(host: str, port: int, timeout: float):
+
+    """
+        Opens (and closes) a TCP connection to a host.
+    :return: Error (in the same words 'connect' would use), or None if the host is reachable, or may be (the probe
+               could not tell, e.g.: out of file descriptors)
+    """
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+
+    # Addresses resolved by 'probe_hosts' (names the resolver failed on are left to 'connect'):
+    if resolver.cached(host) is None:
+        return None
+    try:
+        addresses = resolver.resolve(host, port)
+    except socket.gaierror:
+        return f"Unable to resolve '{host}'."
+
+    # Try each address in turn (as 'connect' would), until one accepts the connection:
+    errors = {}
+    for _, address in addresses:
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(address[0], address[1]), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            return 'Connection timed out'
+        except OSError as err:
+            if err.errno not in UNREACHABLE_ERRORS:
+                return None
+            errors[address[:2]] = err
+            continue
+
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return None
+
+    return str(paramiko.ssh_exception.NoValidConnectionsError(errors))
+
+
+async def preflight(tasks, resolve: bool = True, probe: bool = False, probe_timeout: float = 2):
+
+    """
+        Resolves the names of the hosts tasks connect to directly, and probes them (if asked to).
+    :param tasks: List of tasks
+    :param resolve: Resolve host names
+    :param probe: Probe TCP reachability
+    :param probe_timeout: Time to wait for each connection when probing (seconds)
+    :return: dict of {(host, port): error} for hosts that don't resolve or can't be reached
+    """
+
+    targets = probe_targets(tasks)
+
+    unreachable = {}
+    if resolve:
+        unresolved = await resolver.resolve_all([host for host, _ in targets])
+        unreachable = {target: unresolved[target[0]] for target in targets if target[0] in unresolved}
+    if probe:
+        reachable = [target for target in targets if target not in unreachable]
+        unreachable.update(await probe_hosts(reachable, probe_timeout))
+
+    return unreachable
+
+
+def run_preflight(tasks, resolve: bool = True, probe: bool = False, probe_timeout: float = 2):
+
+    # 'preflight' for callers that aren't coroutines (the threaded 'interaction()'), on an event loop of its own in a
+    #   thread of its own: 'asyncio.run' raises RuntimeError if the caller's thread already runs an event loop:
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(lambda: asyncio.run(preflight(tasks, resolve, probe, probe_timeout))).result()
+
+
+def probe_targets(tasks):
+
+    # Hosts tasks connect to directly (the host itself, or its jump-host). Replayed tasks connect to nothing:
+    targets = []
+    for task in tasks:
+        if task.get('replay') is not None:
+            continue
+        target = task.get('connect_via') if isinstance(task.get('connect_via'), dict) else task
+        if target.get('host') is not None:
+            targets.append((target['host'], target.get('port', 22)))
+    return targets
+
+
+# Connection errors meaning a host can't be reached:
+UNREACHABLE_ERRORS = [errno.ECONNREFUSED, errno.EHOSTUNREACH, errno.ENETUNREACH, errno.ETIMEDOUT]
@@ -0,0 +1,422 @@
+"""
+
+    SSH Replay (replay.py): Records the data sent and received over a session's shell with its timing ('record'), and
+      replays a recording in place of the device ('replay'), so 'connect', 'send_command' and the output parsing can
+      be profiled and regression-tested offline, against transcripts of real devices.
+
+    A recording holds the connection details starlight looks at (SSH version, banner, time taken by each connection
+      phase, see 'timing.py') and the shell's data: each chunk received and each command sent, with the time it was
+      received or sent. Replaying reproduces the timing ('replay_speed': 2 replays twice as fast, 0 as fast as
+      possible). Data is replayed in response to the commands sent, so timing stays true to the device's however long
+      the client takes. Nothing is sent over the network.
+
+    A replayed session expects the commands of the recording, in the same order. A command the recording does not
+      have is logged, and answered with the response recorded for the command it has in its place (or, past the end of
+      the recording, with the session closing).
+
+    Recordings are JSON lines files: the connection details, then one '[time, direction, data]' list per chunk (time
+      since the shell opened, 'recv', 'send' or 'eof', and the data).
+
+    Example:
+
+        session = SSHSession('10.0.0.1', authentication, record='recordings/10.0.0.1.jsonl')
+        ...
+        session = SSHSession('10.0.0.1', authentication, replay='recordings/10.0.0.1.jsonl', replay_speed=0)
+
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+import paramiko
+from paramiko.pipe import make_pipe
+
+from starlight.core.logger import logger
+from .timing import ConnectionTimer, TimedSSHClient
+
+
+class Recording:
+
+    """
+        Recording
+    """
+
+    def __init__(self, header: dict = None, events: list = None):
+
+        self.header = header or {}                     # Connection details (SSH version, banner, phase durations)
+        self.events = events or []                     # (seconds since the shell opened, direction, bytes)
+
+    def __len__(self):
+        return len(self.events)
+
+    def __repr__(self):
+        return f"Recording_{self.header.get('host')}:{self.header.get('port')}"
+
+    @classmethod
+    def load(cls, path: str):
+
+        """
+            Reads a recording.
+        :param path: Recording file (written by 'record')
+        :return: Recording object
+        """
+
+        with open(path, encoding='utf-8') as fh:
+            header = json.loads(fh.readline())
+            if header.get('recording') != RECORDING_VERSION:
+                raise ValueError(f"'{path}' is not a session recording (version {RECORDING_VERSION}).")
+            events = [(offset, direction, decode(data)) for offset, direction, data in map(json.loads, fh)]
+        return cls(header, events)
+
+
+class SessionRecorder:
+
+    """
+        Writes the recording of a session's shell, as data is sent and received.
+    """
+
+    def __init__(self, path: str, header: dict):
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'w', encoding='utf-8')
+        self.file.write(json.dumps({'recording': RECORDING_VERSION, **header}) + '\n')
+        self.start = time.time()                       # Time the shell opened (events are timed from here)
+        self.lock = threading.Lock()                   # Guards 'file'
+
+    def write(self, direction: str, data: bytes):
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(json.dumps([round(time.time() - self.start, 6), direction, encode(data)]) + '\n')
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+
+class RecordingChannel:
+
+    """
+        Shell channel recording the data sent and received over it (all else is passed on to the paramiko channel).
+    """
+
+    def __init__(self, channel, recorder: SessionRecorder):
+
+        self.channel = channel                         # Paramiko channel
+        self.recorder = recorder                       # SessionRecorder
+        self.eof_recorded = False                      # End of the output recorded
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+    @property
+    def eof_received(self):
+        if self.channel.eof_received and not self.eof_recorded:
+            self.eof_recorded = True
+            self.recorder.write('eof', b'')
+        return self.channel.eof_received
+
+    def recv(self, nbytes: int):
+        data = self.channel.recv(nbytes)
+        if data:
+            self.recorder.write('recv', data)
+        return data
+
+    def send(self, data):
+        sent = self.channel.send(data)
+        self.recorder.write('send', (data.encode('utf-8') if isinstance(data, str) else data)[:sent])
+        return sent
+
+    def sendall(self, data):
+        self.channel.sendall(data)
+        self.recorder.write('send', data.encode('utf-8') if isinstance(data, str) else data)
+
+    def close(self):
+        self.channel.close()
+        self.recorder.close()
+
+
+class RecordingSSHClient(TimedSSHClient):
+
+    """
+        Paramiko 'SSHClient' recording the session's shell to a file.
+    """
+
+    def __init__(self, timer: ConnectionTimer, path: str, header: dict = None):
+        super().__init__(timer)
+        self.path = path                               # Recording file
+        self.header = header or {}                     # Details of the session recorded (e.g.: host)
+
+    def invoke_shell(self, *args, **kwargs):
+
+        start = time.time()
+        channel = super().invoke_shell(*args, **kwargs)
+        transport = self.get_transport()
+        banner = transport.get_banner()
+        recorder = SessionRecorder(self.path, {
+            **self.header,
+            'remote_version': transport.remote_version,
+            'remote_cipher': transport.remote_cipher,
+            'remote_mac': transport.remote_mac,
+            'remote_compression': transport.remote_compression,
+            'banner': banner.decode('utf-8', 'ignore') if banner is not None else None,
+            'timing': {**self.timer.phases, 'shell': time.time() - start},
+            'recorded': int(time.time())
+        })
+        return RecordingChannel(channel, recorder)
+
+
+class ReplayTransport:
+
+    """
+        Stands in for the paramiko transport of a replayed session.
+    """
+
+    def __init__(self, client):
+
+        header = client.recording.header
+        self.client = client                           # ReplaySSHClient
+        self.remote_version = header.get('remote_version', 'SSH-2.0-Replay')
+        self.remote_cipher = header.get('remote_cipher')
+        self.remote_mac = header.get('remote_mac')
+        self.remote_compression = header.get('remote_compression', 'none')
+        self.banner = header.get('banner')
+        self.active = True
+
+    def get_banner(self):
+        self.client.pause('banner')
+        return self.banner.encode('utf-8') if self.banner is not None else None
+
+    def is_active(self):
+        return self.active
+
+    def send_ignore(self, byte_count: int = None):
+        pass
+
+    def close(self):
+        self.active = False
+
+
+class ReplayChannel:
+
+    """
+        Stands in for the shell channel of a replayed session: data is received as it was when recorded, in response
+          to the commands sent. The channel is readable ('fileno') while data is waiting, so 'wait_for_data' (and the
+          event loop) wait on it as on a paramiko channel.
+    """
+
+    def __init__(self, recording: Recording, speed: float, transport: ReplayTransport, name: str = None):
+
+        self.events = deque(recording.events)          # Events not replayed yet
+        self.speed = speed                             # Replay speed (times the recorded speed, 0 for no delays)
+        self.transport = transport                     # ReplayTransport
+        self.name = name                               # Name of the session (for logging)
+        self.scheduled = deque()                       # Data due: (time due, direction, bytes)
+        self.buffer = bytearray()                      # Data received (due), not read yet
+        self.closed = False
+        self.eof_received = False
+        self.mismatches = 0                            # Number of commands sent the recording does not have
+        self.markers = {}                              # Batch markers recorded, and the markers sent in their place
+        self.pipe = make_pipe()                        # Readable while data is waiting (see 'fileno')
+        self.timer = None                              # Makes the pipe readable once the next data is due
+        self.lock = threading.Lock()                   # Guards 'pipe' and 'timer'
+        self.schedule(0)
+
+    def schedule(self, offset: float):
+
+        # Schedule the data received after an event (the shell opening, or a command sent) at 'offset' seconds:
+        now = time.time()
+        while len(self.events) > 0 and self.events[0][1] != 'send':
+            event_offset, direction, data = self.events.popleft()
+            due = now + (event_offset - offset) / self.speed if self.speed > 0 else now
+            self.scheduled.append((due, direction, self.substitute(data)))
+        self.signal()
+
+    def substitute(self, data: bytes):
+        for old, new in self.markers.items():
+            data = data.replace(old, new)
+        return data
+
+    def release(self):
+
+        # Move the data that is due into the buffer:
+        now = time.time()
+        while len(self.scheduled) > 0 and self.scheduled[0][0] <= now:
+            _, direction, data = self.scheduled.popleft()
+            if direction == 'eof':
+                self.eof_received = True
+            else:
+                self.buffer += data
+
+    def signal(self):
+
+        # Make the pipe readable while data is waiting, or once the next data is due:
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.closed:
+                return
+            if len(self.buffer) > 0 or self.eof_received or \
+                    (len(self.scheduled) > 0 and self.scheduled[0][0] <= time.time()):
+                self.pipe.set()
+                return
+            self.pipe.clear()
+            if len(self.scheduled) > 0:
+                self.timer = threading.Timer(max(self.scheduled[0][0] - time.time(), 0), self.wake)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def wake(self):
+        with self.lock:
+            if not self.closed:
+                self.pipe.set()
+
+    def fileno(self):
+        return self.pipe.fileno()
+
+    def get_transport(self):
+        return self.transport
+
+    def recv_ready(self):
+        self.release()
+        return len(self.buffer) > 0
+
+    def recv(self, nbytes: int):
+
+        # Wait for the next data due (if none is waiting), as a paramiko channel would block:
+        self.release()
+        while len(self.buffer) == 0 and len(self.scheduled) > 0 and not self.closed:
+            time.sleep(max(self.scheduled[0][0] - time.time(), 0))
+            self.release()
+
+        data = bytes(self.buffer[:nbytes])
+        del self.buffer[:nbytes]
+        self.signal()
+        return data
+
+    def send(self, data):
+
+        if self.closed:
+            raise OSError('Socket is closed')
+        data = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+
+        # Past the end of the recording: the session closes (once the data still due is received):
+        if len(self.events) == 0:
+            logger.warning("%s: Replay: '%s' sent past the end of the recording.", self.name,
+                           data.decode('utf-8', 'ignore').strip())
+            due = self.scheduled[-1][0] if len(self.scheduled) > 0 else time.time()
+            self.scheduled.append((due, 'eof', b''))
+            self.signal()
+            return len(data)
+
+        # Batch markers are new for each batch (see 'batch.py'): the recorded ones are replaced by the ones sent:
+        offset, _, recorded = self.events.popleft()
+        for old, new in zip(BATCH_MARKER.findall(recorded), BATCH_MARKER.findall(data)):
+            if old != new:
+                self.markers[old] = new
+        recorded = self.substitute(recorded)
+
+        if data != recorded:
+            self.mismatches += 1
+            logger.warning("%s: Replay: '%s' sent, the recording has '%s'.", self.name,
+                           data.decode('utf-8', 'ignore').strip(), recorded.decode('utf-8', 'ignore').strip())
+        self.schedule(offset)
+        return len(data)
+
+    def sendall(self, data):
+        self.send(data)
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.pipe.close()
+
+
+class ReplaySSHClient:
+
+    """
+        Stands in for the paramiko 'SSHClient' of a replayed session: 'connect' takes as long as it did when recorded
+          (see 'replay_speed'), and 'invoke_shell' opens a 'ReplayChannel'.
+    """
+
+    def __init__(self, timer: ConnectionTimer, recording: Recording, speed: float = 1, name: str = None):
+
+        self.timer = timer                             # ConnectionTimer
+        self.recording = recording                     # Recording replayed
+        self.speed = speed                             # Replay speed (times the recorded speed, 0 for no delays)
+        self.name = name                               # Name of the session (for logging)
+        self.transport = None                          # ReplayTransport (once connected)
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def pause(self, phase: str):
+
+        # Take as long as a connection phase took when recorded:
+        duration = self.recording.header.get('timing', {}).get(phase)
+        if duration is not None and self.speed > 0:
+            time.sleep(duration / self.speed)
+
+    def connect(self, **kwargs):
+        for phase in REPLAYED_PHASES:
+            if phase in self.recording.header.get('timing', {}):
+                self.pause(phase)
+                self.timer.mark(phase)
+        self.transport = ReplayTransport(self)
+
+    def get_transport(self):
+        return self.transport
+
+    def invoke_shell(self, *args, **kwargs):
+        if self.transport is None or not self.transport.is_active():
+            raise paramiko.SSHException('SSH session not active')
+        self.pause('shell')
+        return ReplayChannel(self.recording, self.speed, self.transport, self.name)
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+
+def ssh_client(self):
+
+    """
+        Paramiko 'SSHClient' a session connects with: one replaying a recording ('replay'), one recording the session
+          ('record'), or a plain one.
+    """
+
+    if self.replay is not None:
+        recording = Recording.load(self.replay) if isinstance(self.replay, str) else self.replay
+        return ReplaySSHClient(ConnectionTimer(), recording, self.replay_speed, f"{self.host}:{self.port}")
+    if self.record is not None:
+        return RecordingSSHClient(ConnectionTimer(), self.record, {'host': self.host, 'port': self.port})
+    return TimedSSHClient(ConnectionTimer())
+
+
+def encode(data: bytes):
+
+    # Bytes as JSON text (bytes that are not valid UTF-8 are kept, as escaped surrogates):
+    return data.decode('utf-8', 'surrogateescape')
+
+
+def decode(text: str):
+    return text.encode('utf-8', 'surrogateescape')
+
+
+RECORDING_VERSION = 1
+
+# Batch marker token (see 'batch.py'):
+BATCH_MARKER = re.compile(rb'STARLIGHT_[0-9a-f]{8}')
+
+# Connection phases reproduced by 'ReplaySSHClient.connect' (the banner and shell are reproduced as they happen):
+REPLAYED_PHASES = ['dns', 'tcp', 'channel', 'kex', 'auth']
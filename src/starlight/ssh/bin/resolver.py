@@ -0,0 +1,129 @@
+"""
+
+    SSH Resolver (resolver.py): Resolves host names, caching the addresses for 'ttl' seconds (names that don't exist
+      for 'negative_ttl' seconds).
+
+    'interaction()' resolves the names of all of its hosts at once before connecting ('resolve_all'), so tasks for
+      names that don't resolve fail without taking a session slot, and sessions (and their retries) connect to the
+      cached addresses rather than each waiting on the resolver ('resolve').
+
+    Failures that may pass (e.g.: resolver timed out) are not cached, and are left to 'connect'.
+
+"""
+
+import asyncio
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from starlight.core.logger import logger
+
+
+class HostResolver:
+
+    """
+        HostResolver
+    """
+
+    def __init__(self, ttl: int = 300, negative_ttl: int = 30):
+
+        self.ttl = ttl                                 # Keep addresses for n seconds
+        self.negative_ttl = negative_ttl               # Keep names that don't exist for n seconds
+        self.cache = {}                                # Names resolved: host -> (time expires, addresses or error)
+        self.lock = threading.Lock()                   # Guards 'cache'
+
+    def __len__(self):
+        return len(self.cache)
+
+    def __repr__(self):
+        return f"HostResolver_{len(self)}"
+
+    def resolve(self, host: str, port: int):
+
+        """
+            Resolves a host name (from the cache, if resolved recently).
+        :param host: Name or IP address of host
+        :param port: Port
+        :return: List of (family, socket address) tuples
+        :raises socket.gaierror: if the name does not resolve
+        """
+
+        result = self.cached(host)
+        if result is None:
+            result = self.lookup(host)
+
+        if isinstance(result, socket.gaierror):
+            raise socket.gaierror(result.errno, result.strerror)
+        return [(family, (address[0], port, *address[2:])) for family, address in result]
+
+    async def resolve_all(self, hosts, concurrency: int = 100):
+
+        """
+            Resolves host names concurrently (names in the cache are not resolved again).
+        :param hosts: Names or IP addresses of hosts (duplicates are only resolved once)
+        :param concurrency: Maximum number of names being resolved at any one time
+        :return: dict of {host: error} for names that don't resolve
+        """
+
+        st = time.time()
+        hosts = list(dict.fromkeys(hosts))
+        results = {host: self.cached(host) for host in hosts}
+        lookups = [host for host, result in results.items() if result is None]
+
+        if len(lookups) > 0:
+            loop = asyncio.get_running_loop()
+            with ThreadPoolExecutor(max_workers=min(concurrency, len(lookups))) as executor:
+                await asyncio.gather(
+                    *[loop.run_in_executor(executor, self.lookup, host) for host in lookups], return_exceptions=True)
+            results.update((host, self.cached(host)) for host in lookups)   # Failures that may pass aren't cached
+
+        # Names that don't exist, whether just looked up or cached (e.g.: on a previous run, within 'negative_ttl'):
+        unresolved = {}
+        for host, result in results.items():
+            if isinstance(result, socket.gaierror):
+                unresolved[host] = f"Unable to resolve '{host}'."
+
+        logger.debug("Resolved %s hosts (%s cached), %s unresolved. (%.2fs)",
+                     len(hosts), len(hosts) - len(lookups), len(unresolved), time.time() - st)
+
+        return unresolved
+
+    def cached(self, host: str):
+
+        # Addresses (or error) cached for a host, None if not cached (or expired):
+        with self.lock:
+            entry = self.cache.get(host)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self.cache[host]
+                return None
+            return entry[1]
+
+    def lookup(self, host: str):
+
+        # Resolve a host name, and cache the result (unless the failure may pass):
+        try:
+            result = [(family, address) for family, _, _, _, address in
+                      socket.getaddrinfo(host, 0, socket.AF_UNSPEC, socket.SOCK_STREAM)]
+            ttl = self.ttl
+        except socket.gaierror as err:
+            if err.errno not in NAME_ERRORS:
+                raise
+            result = err
+            ttl = self.negative_ttl
+
+        with self.lock:
+            self.cache[host] = (time.time() + ttl, result)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.cache = {}
+
+
+# Resolver errors meaning the name does not exist (rather than the resolver failing):
+NAME_ERRORS = [getattr(socket, name) for name in ['EAI_NONAME', 'EAI_NODATA'] if hasattr(socket, name)]
+
+resolver = HostResolver()  # Process-wide resolver
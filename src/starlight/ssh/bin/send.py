@@ -8,21 +8,49 @@ import time
 import re
 
 import starlight.core.logger as logger
-from .identify import id_by_prompt, auto_reponse
-from .utilities import strip_ansi
+from .identify import id_by_prompt, id_by_known_prompt, auto_reponse
+from .utilities import OutputStream, wait_for_data
 
 from pprint import pprint
 
 
-def send_command(self, command: str):
+def send_command(self, command: str, sink=None):
 
     """
 
         Send a single command to a connected device over SSH.
 
+    :param command: Command
+    :param sink: Called with each chunk of output as it is received, rather than returning it (see 'stream.py')
+    :return: Output dict (with a 'sink', without 'output' and 'raw_output', but with 'error' and the timing)
+    """
+
+    steps = command_steps(self, command, sink)
+    try:
+        while True:
+            wait_for_data(self.session_object, next(steps))
+    except StopIteration as finished:
+        return finished.value
+
+
+def command_steps(self, command: str, sink=None):
+
+    """
+
+        Sends a command and processes what is received until the prompt is found, the session closes or times out.
+          This does no waiting itself: whenever it needs more data it yields the number of seconds left before the
+          session times out, and the caller waits (blocking, or asynchronously) for the channel to become readable
+          before resuming it. The output dict is returned once the command completes.
+
+        With a 'sink', output is passed on as it is received and not kept (see 'stream.py').
+
     """
 
     output = {'command': command}
+    stream = None
+    if sink is not None:
+        stream = OutputStream(
+            command, sink, self.prompt.get('known_errors', []) if isinstance(self.prompt, dict) else [])
 
     if isinstance(command, str):
 
@@ -58,8 +86,10 @@ def send_command(self, command: str):
         self.session_object_interact_time = time.time()
         self.session_object.send(command + '\n')
 
-        ssh_output = ''
-        cmd_raw = b''
+        ssh_output = []                 # Received (decoded) chunks, joined once the command completes
+        ssh_text = None                 # Received (decoded) output, once joined
+        cmd_raw = bytearray()           # Received (raw) output, each chunk is copied into this buffer once
+        prompt_tail = ''                # Last (incomplete) line received, used to match prompts and auto-responses
         found_prompt = False
         output['prompt'] = ''
         auto_response_cleanup = []
@@ -69,11 +99,18 @@ def send_command(self, command: str):
             while inv_shell.recv_ready():
                 timer = 0
                 raw_input = inv_shell.recv(65536)
-                self.raw += raw_input
-                cmd_raw += raw_input
+                self.raw_transcript.write(raw_input)
+                if 'time_first_byte' not in output:
+                    output['time_first_byte'] = time.time()
 
                 # Check if data was received and if so, set the retries to 0:
-                ssh_output += strip_ansi(raw_input.decode('utf-8', 'ignore'))
+                text = self.ansi_stripper.feed(raw_input)
+                if stream is None:
+                    cmd_raw += raw_input
+                    ssh_output.append(text)
+                else:
+                    stream.feed(text)
+                    self.history_transcript.write(text)
                 self.session_object_interact_time = time.time()
 
                 # if re.search(r"% Authentication failed", ssh_output, re.MULTILINE | re.DOTALL):
@@ -85,42 +122,58 @@ def send_command(self, command: str):
                 #     ssh_error = f"User '{self.username}' does not have shell access on this device"
                 #     break
 
-                output['prompt'] = ssh_output.split('\n')[-1]
+                # Only the text after the last line break can be a prompt, so keep a bounded tail of it rather than
+                #   splitting the whole output on every chunk:
+                last_newline = text.rfind('\n')
+                if last_newline == -1:
+                    prompt_tail = (prompt_tail + text)[-PROMPT_TAIL_SIZE:]
+                else:
+                    prompt_tail = text[last_newline + 1:][-PROMPT_TAIL_SIZE:]
+                output['prompt'] = prompt_tail
 
             if output['prompt'] != '' and not self.ssh_error and not found_prompt:
 
                 output['time_completed'] = time.time()
-                output['output'] = ssh_output.replace(output['prompt'], '')
-                if '\n' in output['output']:
-                    if output['output'][-1] == '\n':
-                        output['output'] = output['output'][0:-1]
 
-                # See if we can identify what devices this might be based on the prompt:
-                identified = id_by_prompt(output['prompt'])
+                # Check for the prompt already known for this session, otherwise see if we can identify what device
+                #   this might be based on the prompt:
+                identified = id_by_known_prompt(output['prompt'], self.prompt)
+                if not identified:
+                    identified = id_by_prompt(output['prompt'])
                 if identified:
                     self.prompt = identified
                     found_prompt = True
                     self.ssh_error = None
 
+                    if stream is None:
+                        ssh_text = ''.join(ssh_output)
+                        output['output'] = command_output(ssh_text, output['prompt'])
+
+                    # Output streamed (checked for known errors as it was passed on):
+                    else:
+                        ssh_text = ''
+                        stream.finish(output['prompt'])
+                        self.ssh_error = stream.error
+
                     # Check output for known errors:
-                    if 'known_errors' in self.prompt:
+                    if 'known_errors' in self.prompt and stream is None:
                         for error_re in self.prompt['known_errors']:
-                            tmp = re.search(error_re, output['output'], re.MULTILINE | re.DOTALL)
+                            tmp = re.search(error_re, output['output'], re.MULTILINE)
                             if tmp:
                                 self.ssh_error = tmp.group(1).strip().capitalize()
-                                logger.warning(
-                                    "%s: Command '%s' failed, error: '%s'. (%.2fs)",
-                                    logger_prefix, command, self.ssh_error,
-                                    output['time_completed'] - output['time_sent'])
                                 break
 
-                    if not self.ssh_error:
+                    if self.ssh_error:
+                        logger.warning(
+                            "%s: Command '%s' failed, error: '%s'. (%.2fs)",
+                            logger_prefix, command, self.ssh_error, output['time_completed'] - output['time_sent'])
+                    else:
                         logger.debug(
                             "%s: Command '%s' completed. (%.2fs)",
                             logger_prefix, command, output['time_completed'] - output['time_sent'])
 
                 # Check for any auto-response content:
-                auto_reply = auto_reponse(output['prompt'])
+                auto_reply = auto_reponse(output['prompt'], self.answer_paging)
                 if auto_reply:
                     logger.debug(
                         "%s: Found '%s', replied with '%s'.",
@@ -130,9 +183,10 @@ def send_command(self, command: str):
                     if 'clean' in auto_reply:
                         auto_response_cleanup.append(auto_reply['clean'])
                     output['prompt'] = ''
+                    prompt_tail = ''
 
             # Check for when SSH session gets closed/disconnected:
-            if self.session_object.closed:
+            if self.session_object.closed or self.session_object.eof_received:
 
                 # Don't report error if we used a command to close the session on purpose, e.g.: 'exit':
                 if command.lower() in ['exit', 'quit', 'logout']:
@@ -152,13 +206,15 @@ def send_command(self, command: str):
                     self.session_object_closed_time = output['time_failed']
                     break
 
-            # Cater for when a session takes too long (e.g.: Not seeing expected prompt)
-            if (time.time() - self.session_object_start_time) > self.session_object_timeout:
+            # Cater for when a command takes too long (e.g.: Not seeing expected prompt), timed from when it was sent:
+            if (time.time() - output['time_sent']) > self.session_object_timeout:
                 self.ssh_error = "Timed out. No prompt detected."
                 output['time_failed'] = time.time()
                 break
 
-            # time.sleep(0.01)  # Sleep a little to give the CPU a break!
+            # Wait until more data arrives, the channel closes or the session times out (no busy-polling):
+            if not found_prompt:
+                yield self.session_object_timeout - (time.time() - output['time_sent'])
 
         # Remove instances where there are 'DEL' keystrokes followed by spaces, and again 'DEL' keystrokes. This
         #   happens when replying to the 'more' type prompts:
@@ -167,25 +223,63 @@ def send_command(self, command: str):
         #         print(f">> '{r}'")
         #         ssh_output = re.sub(r, '', ssh_output)
 
-        self.history += ssh_output
-        self.session_object_interact_time = time.time()
-        # Remove the command from the start and prompt from the end of the output:
-        output['raw_output'] = re.sub(
-            rb'\r\n.*?$', b'', cmd_raw.replace(rb'' + (command + '\r\n').encode('utf-8'), b''))
+        # Output streamed: pass on what is left if the command did not complete (nothing is kept):
+        if stream is not None:
+            if ssh_text is None:
+                stream.feed(self.ansi_stripper.flush())
+                stream.finish()
+            self.session_object_interact_time = time.time()
+
+        else:
+            if ssh_text is None:
+                ssh_output.append(self.ansi_stripper.flush())
+                ssh_text = ''.join(ssh_output)
+                output['output'] = command_output(ssh_text, output['prompt'])
+            del ssh_output
+
+            self.history_transcript.write(ssh_text)
+            self.session_object_interact_time = time.time()
+            # Remove the command from the start and prompt from the end of the output:
+            output['raw_output'] = re.sub(
+                rb'\r\n.*?$', b'', cmd_raw.replace((command + '\r\n').encode('utf-8'), b''))
 
     else:
         self.ssh_error = f"Error: The 'send_command' function accepts only a string."
         output['time_failed'] = time.time()
 
-    # Generate output
-    if self.ssh_error is None:
+    # Generate output (streamed output is not returned, so its error always is):
+    if self.ssh_error is None or stream is not None:
         output['error'] = self.ssh_error
 
-    tmp = output['output'].split('\r\n')
-    for index, item in enumerate(tmp):
-        tmp[index] = item.replace('\r', '')
-    if tmp[0] == command:
-        tmp.pop(0)
-    output['output'] = '\n'.join(tmp)
+    # Normalize line endings and remove the command echo from the first line:
+    if 'output' in output:
+        output['output'] = output['output'].replace('\r\n', '\n').replace('\r', '')
+        if output['output'].partition('\n')[0] == command:
+            output['output'] = output['output'].partition('\n')[2]
 
     return output
+
+
+def command_output(text, prompt):
+
+    """
+
+        Removes the prompt from the end of the output received for a command (as streamed output does, lines of
+          the output that contain the prompt are kept).
+
+    :param text: Output received (decoded)
+    :param prompt: Prompt found at the end of the output
+    :return: string
+    """
+
+    if prompt != '' and text.endswith(prompt):
+        text = text[:-len(prompt)]
+    if '\n' in text:
+        if text[-1] == '\n':
+            text = text[0:-1]
+
+    return text
+
+
+# Maximum number of characters of the last line kept to match prompts and auto-responses:
+PROMPT_TAIL_SIZE = 1024
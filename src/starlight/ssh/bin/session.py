@@ -1,11 +1,21 @@
 import pprint
+import math
 import time
 import itertools
+import threading
+from collections import deque
 
+from starlight.core.cache import read_cache, update_cache
 from starlight.core.logger import logger
 from .connect import connect
 from .send import send_command
 from .disconnect import disconnect
+from .batch import send_batch
+from .exec import exec_commands
+from .stream import CommandStream, sink_output
+from .task_queue import TaskQueue
+from .transcript import Transcript, transcript_file
+from .utilities import AnsiStripper
 from pprint import pprint
 
 
@@ -34,19 +44,35 @@ class SSHSession:
             is_jump_host: bool = False,
             command_list: list = None,
             max_sessions: int = 10,
+            adaptive_sessions: bool = True,
+            session_cap: int = None,
             task_id: int = None,
+            transcript: str = 'memory',
+            transcript_size: int = 64,
+            transcript_path: str = None,
+            mode: str = 'shell',
+            batch: bool = False,
+            remember_authentication: bool = True,
+            disable_paging: bool = True,
+            record: str = None,
+            replay=None,
+            replay_speed: float = 1,
     ):
 
         self.host = host                               # Name or IP address of host
+        self.address = None                            # IP address connected to (direct connections)
         if isinstance(authentication, dict):
             self.authentication = [authentication]     # Single authentication profile (dict)
         else:
             self.authentication = authentication       # Multiple authentication profiles (list of dicts)
         self.port = port                               # SSH port
         self.connection_timeout = connection_timeout   # SSH Connection timeout
-        self.session_object_timeout = session_timeout  # SSH session timeout
+        self.session_object_timeout = session_timeout  # Command timeout (from when each is sent)
         self.retries = retries                         # Number of connection retries
-        self.retry_interval = retry_interval           # Number of seconds between retries
+        self.retry_interval = retry_interval           # Number of seconds between retries (scheduled by the caller)
+        self.attempts = 0                              # Number of connection attempts ('connect' calls)
+        self.defer_retries = False                     # Leave retries to the caller (status 'retry', see 'retry_delay')
+        self.failed_authentication = []                # Profiles not to retry (failed for good), when deferring retries
         self.compression = compression                 # Use SSH compression
         self.vendor = vendor                           # Assume vendor
         self.keepalive_interval = 120                  # Send keepalive every n seconds
@@ -54,16 +80,42 @@ class SSHSession:
         self.session_id = next(SSHSession.session_id)  # Session ID
         self.session_object_start_time = None          # Time connection established
         self.session_object = None                     # Paramiko 'invoke_shell' session object
+        self.ssh_client = None                         # Paramiko 'SSHClient' object (owns the transport)
         self.status = None                             # Status
         self.session_object_interact_time = None       # Time of last comms to/from device
         self.session_object_closed_time = None         # Time session closed
         self.ssh_error = None                          # SSH Error
-        self.raw = b''                                 # Raw SSH output
         self.prompt = ''                               # Current prompt info
-        self.history = ''                              # Session history
+        self.ansi_stripper = AnsiStripper()            # Strips escape codes from data received (across chunks)
+        self.transcript = transcript                   # Transcript policy: 'memory', 'ring', 'file' or 'off'
+        self.raw_transcript = Transcript(              # Raw SSH output (see 'raw')
+            transcript, size=transcript_size, binary=True,
+            path=transcript_file(transcript_path, host, port, self.session_id, 'raw')
+            if transcript == 'file' else None)
+        self.history_transcript = Transcript(          # Session history (see 'history')
+            transcript, size=transcript_size,
+            path=transcript_file(transcript_path, host, port, self.session_id, 'log')
+            if transcript == 'file' else None)
         self.jump_host = connect_via                   # Connect via this SSHSession session (SSHSession object)
+        self.mode = mode                               # 'shell' (interactive shell) or 'exec' (exec channels)
+        self.batch = batch                             # Send command lists in one go, split by markers (shell mode)
+        self.authentication_index = None               # Index of the authentication profile used to log in
+        self.timing = {}                               # Time taken by each phase of connecting (see 'timing.py')
+        # Try the authentication profile that last worked for the host first (remembered between runs):
+        self.remember_authentication = remember_authentication
+        self.disable_paging = disable_paging           # Send the device's command to disable paging once connected
+        self.paging = True                             # Device pages long output (False once paging is disabled)
+        self.answer_paging = True                      # Answer paging prompts (see 'SSH_AUTO_RESPONSE')
+        self.record = record                           # Record the shell to this file (see 'replay.py')
+        self.replay = replay                           # Replay this recording (file or 'Recording'), not connecting
+        self.replay_speed = replay_speed               # Replay at n times the recorded speed (0: no delays)
         self.task_id = task_id                         # The task_id (used to update session manager once task complete)
 
+        if mode not in SESSION_MODES:
+            raise ValueError(f"Session mode must be one of: {', '.join(SESSION_MODES)}.")
+        if mode == 'exec' and (record is not None or replay is not None):
+            raise ValueError("Sessions can only be recorded or replayed in 'shell' mode.")
+
         if command_list is None:
             self.command_list = []
         elif isinstance(command_list, str):
@@ -77,7 +129,8 @@ class SSHSession:
 
             # Set up session manager for jump-host:
             if not hasattr(self.jump_host, 'session_manager'):
-                self.session_manager = SessionManager(max_sessions=max_sessions)
+                self.session_manager = SessionManager(
+                    max_sessions=max_sessions, adaptive=adaptive_sessions, cap=session_cap, name=f"{host}:{port}")
 
         # If we see connect_via, then we need to use the session manager to manage the connects via this host:
         # else:
@@ -98,32 +151,92 @@ class SSHSession:
     def __repr__(self):
         return f"SSHSession_{self.host}:{self.port}"
 
+    @property
+    def raw(self):
+        return self.raw_transcript.getvalue()
+
+    @raw.setter
+    def raw(self, value):
+        self.raw_transcript.clear()
+        self.raw_transcript.write(value)
+
+    @property
+    def history(self):
+        return self.history_transcript.getvalue()
+
+    @history.setter
+    def history(self, value):
+        self.history_transcript.clear()
+        self.history_transcript.write(value)
+
     def connect(self):
         return connect(self)
 
-    def send_command(self, command_list):
-        return send_command(self, command_list)
+    def send_command(self, command_list, sink=None):
+        if self.mode == 'exec':
+            return sink_output(exec_commands(self, [command_list])[0], sink)
+        return send_command(self, command_list, sink)
+
+    def stream_command(self, command: str):
+        return CommandStream(self, command)
+
+    def send_commands(self, command_list: list):
+
+        # Runs a list of commands: in parallel in 'exec' mode, in one go in 'batch' mode, or one after the other
+        #   (until one fails) in the shell:
+        if self.mode == 'exec':
+            return exec_commands(self, command_list)
+        if self.batch and len(command_list) > 1:
+            return send_batch(self, command_list)
+
+        results = []
+        for command in command_list:
+            if self.ssh_error is None:
+                results.append(self.send_command(command))
+        return results
 
     def disconnect(self):
         return disconnect(self)
 
+    def is_alive(self):
+
+        # Checks the session is connected and its channel (shell mode) and transport are still open:
+        if self.status != 'connected' or self.session_object is None:
+            return False
+        if self.mode == 'shell' and (self.session_object.closed or self.session_object.eof_received):
+            return False
+        transport = self.session_object.get_transport()
+        return transport is not None and transport.is_active()
+
     def send_keepalive(self):
-        if not self.session_object.closed:
-            if time.time() - self.session_object_start_time > self.keepalive_interval:
-                self.session_object.send('')
+
+        # Send an empty command if nothing was sent/received for 'keepalive_interval' seconds (resets idle timers on
+        #   the host, e.g.: 'exec-timeout', and checks the prompt comes back). Returns True if the session is alive:
+        if not self.is_alive():
+            return False
+        if time.time() - self.session_object_interact_time > self.keepalive_interval:
+            if self.mode == 'exec':
+                self.session_object.get_transport().send_ignore()
                 self.session_object_interact_time = time.time()
+            else:
+                self.send_command('')
+        return self.ssh_error is None and self.is_alive()
 
 
 class SessionManager:
 
     def __init__(
             self,
-            max_sessions: int = 10,                    # Maximum number of sessions
+            max_sessions: int = 10,                    # Maximum number of sessions (starting limit, if adaptive)
             connection_timeout: int = 30,              # Default connection timeout for connections via this host
             session_timeout: int = 180,                # Default session timeout for connections via this host
             retries: int = 2,                          # Default number of retries for connections via this host
             retry_interval: int = 15,                  # Default retry interval for connections via this host
             compression: bool = False,                 # Default compression for connections via this host
+            adaptive: bool = False,                    # Adapt the session limit to channel open failures/latency
+            cap: int = None,                           # Most sessions the adaptive limit can grow to (default:
+                                                       #   'max_sessions' x 'ADAPTIVE_CAP_FACTOR')
+            name: str = None,                          # Name of host (key used to remember the learned limit)
     ):
 
         self.defaults = {
@@ -136,42 +249,190 @@ class SessionManager:
 
         self.current_sessions = 0
         self.max_sessions = max_sessions
-        self.queue = []
+        self.cap = max_sessions if not adaptive else max(max_sessions, cap or max_sessions * ADAPTIVE_CAP_FACTOR)
+        self.queue = TaskQueue()                       # Tasks waiting for a session slot
 
         self.sessions = {}
-        for session in range(max_sessions):
+        for session in range(self.cap):
             self.sessions[session + 1] = {
                 "id": None,
                 "status": 'idle',
                 "activity": None
             }
 
+        self.free_slots = deque(self.sessions)         # Idle session slots
+        self.allocated = {}                            # Session ids and the session slot allocated to them
+        self.condition = threading.Condition()         # Guards slots, notified when a slot is freed
+
+        # Adaptive session limit (additive increase, multiplicative decrease), starting at 'max_sessions' and capped by
+        #   'cap', so it can find capacity above the configured limit:
+        self.adaptive = adaptive
+        self.name = name
+        self.limit = max_sessions                      # Current session limit
+        self.threshold = max_sessions                  # Grow by one per open below this (slow start), then slowly
+        self.hold = 0                                  # Number of results to ignore after backing off (in flight)
+        self.opened = 0                                # Most sessions open at once when a channel opened
+        self.refused = None                            # Fewest sessions open at once when the host refused a channel
+        self.latency = None                            # Channel open latency (moving average)
+        self.latency_base = {}                         # Uncongested channel open latency per target (lowest seen,
+                                                       #   drifts up): (host, port) -> seconds
+        self.slowdown = 1                              # Channel open latency / target's base latency (moving average)
+
+        # Start at the configured limit, or at the limit learned in earlier runs:
+        if self.adaptive:
+            learned = read_cache('jump_hosts').get(name, {}) if name is not None else {}
+            if 'limit' in learned:
+                self.limit = self.threshold = max(1, min(self.cap, learned['limit']))
+
+    def acquire(self, session_id: int = None, blocking: bool = True, timeout: float = None):
+
+        """
+            Allocates a session slot to a session.
+        :param session_id: Session (or task) id the slot is allocated to
+        :param blocking: Wait for a slot to be freed if all are busy
+        :param timeout: Maximum number of seconds to wait (None waits until a slot is freed)
+        :return: Session slot id, or 0 if all are busy
+        """
+
+        with self.condition:
+
+            if session_id is not None and session_id in self.allocated:
+                return self.allocated[session_id]
+
+            if blocking and not self.available():
+                self.condition.wait_for(self.available, timeout)
+
+            if not self.available():
+                return 0
+
+            slot = self.free_slots.popleft()
+            self.sessions[slot]['status'] = 'allocated'
+            self.sessions[slot]['activity'] = time.time()
+            self.sessions[slot]['id'] = session_id
+            if session_id is not None:
+                self.allocated[session_id] = slot
+            self.current_sessions += 1
+            return slot
+
+    def release(self, session_id: int):
+
+        """
+            Frees the session slot allocated to a session.
+        :param session_id: Session (or task) id the slot was allocated to
+        :return: Session slot id freed, or 0 if none was allocated
+        """
+
+        with self.condition:
+
+            slot = self.allocated.pop(session_id, 0)
+            if slot > 0:
+                self.sessions[slot]['status'] = 'idle'
+                self.sessions[slot]['id'] = None
+                self.sessions[slot]['activity'] = None
+                self.free_slots.append(slot)
+                self.current_sessions -= 1
+                self.condition.notify()
+            return slot
+
+    def available(self):
+
+        # Checks if a session slot is free and within the current session limit (call with the condition held):
+        return len(self.free_slots) > 0 and self.current_sessions < int(self.limit)
+
+    def record_open(self, latency: float, target: tuple = None):
+
+        """
+            Records a channel opened through the host. Grows the session limit, unless channel opens are getting
+              slower, which means the host (or its sshd rate limits) is struggling and the limit backs off.
+
+            Opening a channel includes the jump-host's TCP connect to the target, so each open is only compared with
+              earlier opens to the same target (targets differ in round trip time): the first open to a target doesn't
+              count as slow, and where each target is opened once only rejections (see 'record_failure') back off.
+        :param latency: Seconds taken to open the channel
+        :param target: Target the channel was opened to, (host, port)
+        """
+
+        with self.condition:
+
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            base = self.latency_base.get(target)
+            if base is None or latency < base:
+                self.latency_base[target] = latency
+            else:
+                self.latency_base[target] = base + (latency - base) * ADAPTIVE_LATENCY_DRIFT
+            slow = base is not None and latency > base + ADAPTIVE_LATENCY_MARGIN
+            if base is not None:
+                self.slowdown = 0.8 * self.slowdown + 0.2 * latency / max(base, 0.001)
+            self.hold = max(0, self.hold - 1)
+            self.opened = max(self.opened, self.current_sessions)
+
+            if not self.adaptive:
+                return
+
+            if slow and self.slowdown > ADAPTIVE_LATENCY_FACTOR:
+                self.back_off(ADAPTIVE_LATENCY_DECREASE)
+            elif self.limit < self.threshold:
+                self.limit = min(self.cap, self.limit + 1)
+            else:
+                self.limit = min(self.cap, self.limit + 1 / self.limit)
+
+            self.condition.notify_all()
+
+    def record_failure(self):
+
+        """
+            Records a channel open rejected by the host for lack of capacity (e.g.: sshd 'MaxSessions' or rate
+              limits), and halves the session limit.
+        :return: True if other sessions were open (so the host was busy and the session can be retried later)
+        """
+
+        with self.condition:
+            self.hold = max(0, self.hold - 1)
+            self.refused = self.current_sessions if self.refused is None else min(self.refused, self.current_sessions)
+            if self.adaptive and self.hold == 0:
+                self.back_off(ADAPTIVE_FAILURE_DECREASE)
+            return self.current_sessions > 1
+
+    def back_off(self, factor: float):
+
+        # Reduce the session limit, once per round trip (sessions already in flight were started before backing off):
+        if self.hold > 0:
+            return
+        self.limit = self.threshold = max(1, math.floor(self.limit * factor))
+        self.hold = self.current_sessions
+        logger.debug("%s: Session limit reduced to %s.", self.name, self.limit)
+
+    def save(self):
+
+        # Remember the learned session limit for the next run. If the host refused channels, the most sessions that
+        #   opened with fewer open than it refused at:
+        if self.adaptive and self.name is not None and self.latency is not None:
+            limit = int(self.limit) if self.refused is None else max(1, min(self.opened, self.refused - 1))
+            update_cache('jump_hosts', self.name, {
+                'limit': limit,
+                'latency': round(self.latency, 3),
+                'updated': int(time.time())
+            })
+
     def get_next_available_session(self, session_id: int = None):
 
         # Checks if there is an available session to connect via. Returns an available session id, or 0 if all are busy.
-        if self.current_sessions <= self.max_sessions:
-            for index, session in enumerate(range(1, self.max_sessions + 1)):
-                if self.sessions[index + 1]['status'] == 'idle':
-                    self.sessions[index + 1]['status'] = 'allocated'
-                    self.sessions[index + 1]['activity'] = time.time()
-                    self.sessions[index + 1]['id'] = session_id
-                    self.current_sessions += 1
-                    return index + 1
-        return 0
+        return self.acquire(session_id, blocking=False)
 
     def find_session(self, session_id: int):
-        for jh_session in self.sessions:
-            if self.sessions[jh_session]['id'] == session_id:
-                return jh_session
-        return 0
-
+        with self.condition:
+            return self.allocated.get(session_id, 0)
 
     def free_session(self, session_id: int):
-        jh_session_id = self.find_session(session_id)
-        if jh_session_id > 0:
-            self.sessions[jh_session_id]['status'] = 'idle'
-            self.sessions[jh_session_id]['id'] = None
-            self.sessions[jh_session_id]['activity'] = None
-            self.current_sessions -= 1
-            return jh_session_id
-        return 0
+        return self.release(session_id)
+
+
+SESSION_MODES = ['shell', 'exec']
+
+# Adaptive session limits:
+ADAPTIVE_CAP_FACTOR = 4                                # Default cap: 'max_sessions' x factor
+ADAPTIVE_FAILURE_DECREASE = 0.5                        # Limit multiplier when a channel open is rejected
+ADAPTIVE_LATENCY_DECREASE = 0.75                       # Limit multiplier when channel opens slow down
+ADAPTIVE_LATENCY_FACTOR = 2                            # Slowed down: latency above the target's base x factor...
+ADAPTIVE_LATENCY_MARGIN = 0.05                         # ...and more than this many seconds above the target's base
+ADAPTIVE_LATENCY_DRIFT = 0.05                          # Base latency moves up towards the latency seen by this ratio
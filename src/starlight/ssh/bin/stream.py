@@ -0,0 +1,71 @@
+"""
+
+    SSH Stream (stream.py): Passes a command's output on as it is received, rather than once the command completes, so
+      large output can be written to a file or parsed without holding all of it in memory.
+
+    Output is passed on decoded and with escape codes stripped, as complete lines (see 'OutputStream'). The command echo
+      and the prompt are left out, so the chunks add up to the 'output' 'send_command' returns. The output dict is
+      returned without 'output' and 'raw_output' (nothing is kept), but with 'error' (known errors are looked for as
+      the output is passed on) and the timing ('time_sent', 'time_first_byte', 'time_completed' or 'time_failed').
+
+    Example:
+
+        with open('running-config.txt', 'w') as f:
+            result = session.send_command('show running-config', sink=f.write)
+
+        stream = session.stream_command('show running-config')
+        for chunk in stream:
+            parser.feed(chunk)
+        result = stream.result
+
+"""
+
+from .exec import exec_commands
+from .send import command_steps
+from .utilities import wait_for_data
+
+
+class CommandStream:
+
+    """
+        Iterates over the chunks of a command's output as they are received ('SSHSession.stream_command'). The output
+          dict is in 'result' once all of the output has been read.
+    """
+
+    def __init__(self, session, command: str):
+
+        self.session = session                         # SSHSession object
+        self.command = command                         # Command
+        self.result = None                             # Output dict (once the command completes)
+
+    def __iter__(self):
+
+        # Exec mode output is read in one go:
+        if self.session.mode == 'exec':
+            chunks = []
+            self.result = sink_output(exec_commands(self.session, [self.command])[0], chunks.append)
+            yield from chunks
+            return
+
+        chunks = []
+        steps = command_steps(self.session, self.command, sink=chunks.append)
+        try:
+            while True:
+                timeout = next(steps)
+                yield from chunks
+                chunks.clear()
+                wait_for_data(self.session.session_object, timeout)
+        except StopIteration as finished:
+            self.result = finished.value
+        yield from chunks
+
+
+def sink_output(output: dict, sink):
+
+    # Pass on the output of a command that was not streamed (e.g.: exec mode) in one go, as if it had been:
+    if sink is not None and 'output' in output:
+        output.pop('raw_output', None)
+        text = output.pop('output')
+        if text != '':
+            sink(text)
+    return output
@@ -0,0 +1,101 @@
+"""
+
+    SSH Task Queue (task_queue.py): Queue of tasks waiting for a session slot (see 'SessionManager.queue'), ordered by
+      priority rather than first come, first served.
+
+    Tasks run by 'priority' (highest first, None or default 0), then by 'deadline' (earliest first), then in the order
+      they were queued. A task's 'deadline' is the time (epoch seconds or a datetime) after which it is no longer worth
+      running (e.g.: the end of a change window): tasks still queued then are dropped before they take a session slot,
+      and listed in 'expired'.
+
+    Adding and taking tasks is O(log n) (a heap), rather than O(n) for a list's 'pop(0)'.
+
+    Example:
+
+        tasks = [
+            {'host': 'core-01', 'priority': 10, ...},
+            {'host': 'edge-01', 'deadline': datetime.datetime(2025, 11, 2, 6), ...},
+        ]
+
+"""
+
+import datetime
+import heapq
+import itertools
+import math
+import time
+
+
+class TaskQueue:
+
+    """
+        TaskQueue
+    """
+
+    def __init__(self, tasks=None):
+
+        self.heap = []                                 # Heap of (-priority, deadline, order, task)
+        self.order = itertools.count()                 # Order tasks were queued in (first queued runs first)
+        self.front = itertools.count(-1, -1)           # Order of tasks queued again, ahead of the others
+        self.expired = []                              # Tasks dropped, their deadline passed while queued
+
+        for task in tasks or []:
+            self.push(task)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __repr__(self):
+        return f"TaskQueue_{len(self)}"
+
+    def push(self, task: dict, front: bool = False):
+
+        """
+            Queues a task.
+        :param task: Task (dict, optionally with 'priority' and 'deadline')
+        :param front: Queue the task ahead of the others of the same priority (e.g.: queued again after being refused)
+        """
+
+        order = next(self.front) if front else next(self.order)
+        heapq.heappush(self.heap, (-(task.get('priority') or 0), deadline(task), order, task))
+
+    def peek(self):
+
+        """
+            Finds the next task to run, dropping tasks whose deadline passed (to 'expired').
+        :return: Task, or None if the queue is empty
+        """
+
+        now = time.time()
+        while len(self.heap) > 0 and self.heap[0][1] <= now:
+            self.expired.append(heapq.heappop(self.heap)[3])
+        return self.heap[0][3] if len(self.heap) > 0 else None
+
+    def pop(self):
+
+        """
+            Takes the task 'peek' returned (call 'peek' first: its deadline isn't checked again, so the task taken is
+              the one found, even if its deadline passed in between).
+        :return: Task, or None if the queue is empty
+        """
+
+        return heapq.heappop(self.heap)[3] if len(self.heap) > 0 else None
+
+    def drain(self):
+
+        # Take all of the tasks queued (in the order they would have run) and those expired:
+        tasks = [item[3] for item in sorted(self.heap, key=lambda item: item[:3])] + self.expired
+        self.heap = []
+        self.expired = []
+        return tasks
+
+
+def deadline(task: dict):
+
+    # Deadline of a task as epoch seconds (infinite if it has none):
+    value = task.get('deadline')
+    if value is None:
+        return math.inf
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return float(value)
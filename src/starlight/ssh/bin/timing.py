@@ -0,0 +1,173 @@
+"""
+
+    SSH Timing (timing.py): Records how long each phase of setting up a session takes, so a slow run can be traced to
+      name resolution, the network, a jump-host, AAA (authentication) or the device itself.
+
+    Each connected session has a 'timing' dict of phase durations (seconds), in the order they happen:
+
+        'dns'         Resolving the host name (direct connections)
+        'tcp'         TCP connect (direct connections)
+        'channel'     Opening the channel on the jump-host (connections via a jump-host)
+        'kex'         SSH version exchange and key exchange
+        'auth'        Authentication
+        'banner'      Reading the login banner
+        'shell'       Opening the shell (not in 'exec' mode)
+        'prompt'      Waiting for the first prompt (including 'sudo', if used)
+        'total'       All of the above
+
+    Command output dicts have 'time_first_byte' (time the first data was received) next to 'time_sent' and
+      'time_completed' (time the prompt was received). 'timing_summary' aggregates both over a run's tasks. In the
+      shell, the first data received is usually the device echoing the command, so 'time_first_byte' measures the
+      round trip rather than how long the device took to start answering (exec mode has no echo).
+
+"""
+
+import errno
+import socket
+import time
+
+import paramiko
+
+from .resolver import resolver
+
+
+class ConnectionTimer:
+
+    """
+        ConnectionTimer
+    """
+
+    def __init__(self):
+
+        self.start = time.time()                       # Time the connection attempt started
+        self.last = self.start                         # Time the last phase completed
+        self.phases = {}                               # Phase durations (seconds)
+
+    def mark(self, phase: str):
+
+        # Phase completed (it started when the previous one completed), adding up if it is repeated (e.g.: trying a
+        #   key, then a password):
+        now = time.time()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self.last
+        self.last = now
+
+    def result(self):
+        return {**self.phases, 'total': self.last - self.start}
+
+
+class TimedSSHClient(paramiko.SSHClient):
+
+    """
+        Paramiko 'SSHClient' separating the key exchange from authentication (see 'TimedTransport').
+    """
+
+    def __init__(self, timer: ConnectionTimer):
+        super().__init__()
+        self.timer = timer
+
+    def connect(self, *args, **kwargs):
+        kwargs.setdefault('transport_factory', self.transport)
+        return super().connect(*args, **kwargs)
+
+    def transport(self, *args, **kwargs):
+
+        # Transport for 'connect', recording its phases on the current timer:
+        transport = TimedTransport(*args, **kwargs)
+        transport.timer = self.timer
+        return transport
+
+
+class TimedTransport(paramiko.Transport):
+
+    """
+        Paramiko 'Transport' recording when the key exchange ('start_client') and authentication ('auth_*') complete.
+    """
+
+    timer = None                                       # ConnectionTimer
+
+    def start_client(self, *args, **kwargs):
+        super().start_client(*args, **kwargs)
+        self.timer.mark('kex')
+
+    def auth_password(self, *args, **kwargs):
+        return self.timed_auth(super().auth_password, *args, **kwargs)
+
+    def auth_publickey(self, *args, **kwargs):
+        return self.timed_auth(super().auth_publickey, *args, **kwargs)
+
+    def auth_interactive(self, *args, **kwargs):
+        return self.timed_auth(super().auth_interactive, *args, **kwargs)
+
+    def timed_auth(self, method, *args, **kwargs):
+
+        # Authentication attempts add up, successful or not:
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self.timer.mark('auth')
+
+
+def open_socket(host: str, port: int, timeout: float, timer: ConnectionTimer):
+
+    """
+        Resolves the host name (see 'resolver.py') and opens a TCP connection to the first address accepting it (as
+          'SSHClient.connect' would), recording both phases.
+    :param host: Name or IP address of host
+    :param port: Port
+    :param timeout: Connection timeout (seconds)
+    :param timer: ConnectionTimer
+    :return: Connected socket
+    """
+
+    addresses = resolver.resolve(host, port)
+    timer.mark('dns')
+
+    errors = {}
+    for family, address in addresses:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(address)
+        except socket.error as err:
+            sock.close()
+            if err.errno not in (errno.ECONNREFUSED, errno.EHOSTUNREACH):
+                raise
+            errors[address] = err
+            continue
+        timer.mark('tcp')
+        return sock
+
+    # No address accepted the connection (same error as 'SSHClient.connect'):
+    raise paramiko.ssh_exception.NoValidConnectionsError(errors)
+
+
+def timing_summary(tasks, percentiles: tuple = (50, 90, 99)):
+
+    """
+        Aggregates connection and command timings over the tasks of a run (e.g.: as returned by 'interaction()').
+    :param tasks: List of tasks
+    :param percentiles: Percentiles to report
+    :return: dict of {phase: {'count': n, 'p50': seconds, ..., 'max': seconds}}, connection phases followed by
+               'first_byte' (time to first byte) and 'command' (time to prompt) for commands
+    """
+
+    samples = {}
+    for task in tasks:
+        for phase, duration in (task.get('timing') or {}).items():
+            samples.setdefault(phase, []).append(duration)
+        for output in task.get('results') or []:
+            if 'time_first_byte' in output:
+                samples.setdefault('first_byte', []).append(output['time_first_byte'] - output['time_sent'])
+            if 'time_completed' in output:
+                samples.setdefault('command', []).append(output['time_completed'] - output['time_sent'])
+
+    summary = {}
+    for phase, durations in samples.items():
+        durations.sort()
+        summary[phase] = {'count': len(durations)}
+        for percentile in percentiles:
+            index = min(int(round(percentile / 100 * (len(durations) - 1))), len(durations) - 1)
+            summary[phase][f"p{percentile}"] = durations[index]
+        summary[phase]['max'] = durations[-1]
+
+    return summary
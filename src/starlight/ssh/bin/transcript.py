@@ -0,0 +1,128 @@
+"""
+
+    SSH Transcript (transcript.py): Keeps a record of data received during an SSH session according to a policy, so
+      memory used per session does not grow with the amount of output.
+
+    Policies:
+      'memory': Keep everything in memory (default)
+      'ring':   Keep only the most recent 'size' KB in memory
+      'file':   Stream everything to a file, nothing is kept in memory
+      'off':    Keep nothing
+
+"""
+
+import os
+from collections import deque
+
+from starlight.core.logger import log_path
+
+
+TRANSCRIPT_POLICIES = ['memory', 'ring', 'file', 'off']
+
+
+class Transcript:
+
+    """
+        Transcript
+    """
+
+    def __init__(self, policy: str = 'memory', size: int = 64, path: str = None, binary: bool = False):
+
+        if policy not in TRANSCRIPT_POLICIES:
+            raise ValueError(f"Transcript policy must be one of: {', '.join(TRANSCRIPT_POLICIES)}.")
+        if policy == 'file' and path is None:
+            raise ValueError("Transcript policy 'file' requires a path.")
+
+        self.policy = policy                           # Transcript policy
+        self.limit = size * 1024                       # Maximum size of 'ring' transcripts (bytes or characters)
+        self.path = path                               # File used by 'file' transcripts
+        self.binary = binary                           # Transcript holds bytes (True) or text (False)
+        self.empty = b'' if binary else ''
+        self.length = 0                                # Size of data currently held in memory
+        self.chunks = deque()                          # Chunks held in memory ('memory' and 'ring' transcripts)
+        self.file = None
+
+        if policy == 'file':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.open('wb' if binary else 'w')
+
+    def __len__(self):
+        return self.length
+
+    def write(self, data):
+
+        # Add data to the transcript:
+        if not data or self.policy == 'off':
+            return
+
+        if self.policy == 'file':
+            if self.file.closed:
+                self.open('ab' if self.binary else 'a')
+            self.file.write(data)
+            self.length += len(data)
+            return
+
+        self.chunks.append(data)
+        self.length += len(data)
+
+        if self.policy == 'ring':
+
+            # Drop the oldest chunks once over the limit, trimming (rather than dropping) the last one needed:
+            while len(self.chunks) > 0 and self.length - len(self.chunks[0]) >= self.limit:
+                self.length -= len(self.chunks.popleft())
+            if self.length > self.limit:
+                excess = self.length - self.limit
+                self.chunks[0] = self.chunks[0][excess:]
+                self.length -= excess
+
+    def getvalue(self):
+
+        # Return the transcript held (or, for 'file' transcripts, read it back from disk):
+        if self.policy == 'file':
+            if not self.file.closed:
+                self.file.flush()
+            if self.binary:
+                with open(self.path, 'rb') as fh:
+                    return fh.read()
+            with open(self.path, 'r', encoding='utf-8', newline='') as fh:
+                return fh.read()
+
+        value = self.empty.join(self.chunks)
+        if len(self.chunks) > 1:
+            self.chunks = deque([value])
+        return value
+
+    def clear(self):
+
+        # Discard the transcript:
+        self.chunks.clear()
+        self.length = 0
+        if self.file is not None and not self.file.closed:
+            self.file.seek(0)
+            self.file.truncate()
+        elif self.file is not None:
+            open(self.path, 'w').close()
+
+    def open(self, mode: str):
+
+        # Open the transcript file (again, appending, for a session connecting again after a failed attempt):
+        if self.binary:
+            self.file = open(self.path, mode)
+        else:
+            self.file = open(self.path, mode, encoding='utf-8', newline='')
+
+    def close(self):
+
+        # Close the transcript file (if any):
+        if self.file is not None and not self.file.closed:
+            self.file.close()
+
+
+def transcript_file(directory, host, port, session_id, extension):
+
+    # Work out the file a session's transcript is streamed to:
+    if directory is None:
+        directory = f"{log_path}/transcripts"
+    host = ''.join(c if c.isalnum() or c in '.-_' else '_' for c in str(host))
+
+    return os.path.join(directory, f"{host}_{port}_{session_id}.{extension}")
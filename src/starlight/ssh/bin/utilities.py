@@ -1,4 +1,8 @@
+import asyncio
+import codecs
 import re
+import select
+import time
 
 
 def strip_ansi(text):
@@ -11,7 +15,188 @@ def strip_ansi(text):
     :return: string
     """
 
-    axtc_regex = r'\x1B(?:[@-Z\\-_][0-9];~\x07|\[[0-?]*[ -/]*[@-~])'
-    axtc_escape = re.compile(axtc_regex, flags=re.IGNORECASE)
+    return AXTC_ESCAPE.sub('', text)
 
-    return axtc_escape.sub('', text)
+
+class AnsiStripper:
+
+    """
+
+        Strips AXTC escape codes from a stream of chunks (e.g. from consecutive 'recv()' calls). An escape sequence
+          split across two chunks is held back until the rest of it arrives, so it does not leak into the output.
+          Likewise, the bytes of a multibyte character split across two chunks are decoded once the character is
+          complete, rather than being dropped.
+
+    """
+
+    def __init__(self, encoding: str = 'utf-8'):
+
+        self.encoding = encoding                       # Encoding used to decode the cleaned bytes
+        self.pending = b''                             # Incomplete escape sequence at the end of the last chunk
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='ignore')
+
+    def feed(self, data: bytes) -> str:
+
+        """
+            Strips escape codes from the next chunk.
+        :param data: Chunk received (bytes)
+        :return: Cleaned text
+        """
+
+        if self.pending:
+            data = self.pending + data
+            self.pending = b''
+
+        # Escape codes are plain ASCII, so they can be removed before decoding. Most chunks contain none at all:
+        if b'\x1b' in data:
+            data = AXTC_ESCAPE_BYTES.sub(b'', data)
+            partial = AXTC_PARTIAL_BYTES.search(data, max(0, len(data) - AXTC_MAX_PARTIAL))
+            if partial:
+                self.pending = data[partial.start():]
+                data = data[:partial.start()]
+
+        return self.decoder.decode(data)
+
+    def flush(self) -> str:
+
+        """
+            Returns anything held back (e.g. when the stream ends with an incomplete escape sequence).
+        :return: Text held back
+        """
+
+        data, self.pending = self.pending, b''
+        return self.decoder.decode(data, final=True)
+
+
+class OutputStream:
+
+    """
+
+        Passes a command's output on to a sink as it is received (see 'stream.py'), as complete lines: the last line
+          received is held back until the next line break, as it may be the prompt. The command echo and the trailing
+          prompt are left out, and line endings normalised, as for the 'output' of 'send_command'.
+
+        Known errors are looked for in each chunk before line endings are normalised, as 'send_command' does in the
+          output it returns (so both find the same errors, but for patterns spanning more than one chunk).
+
+    """
+
+    def __init__(self, command: str, sink, known_errors: list = None):
+
+        self.command = command                         # Command sent (its echo is left out)
+        self.sink = sink                               # Called with each chunk of output
+        self.known_errors = known_errors or []         # Regular expressions of errors to look for (see 'SSH_PROMPTS')
+        self.pending = ''                              # Text not passed on yet (from the last line break)
+        self.started = False                           # First line (command echo) checked
+        self.error = None                              # First known error found
+
+    def feed(self, text: str):
+
+        # Pass on the complete lines received, keeping the last line break and what follows:
+        self.pending += text
+        if not self.started:
+            if '\n' not in self.pending:
+                return
+            self.started = True
+            first, _, rest = self.pending.partition('\n')
+            if first.replace('\r', '') == self.command:
+                self.pending = rest
+
+        end = self.pending.rfind('\n')
+        if end > 0:
+            self.emit(self.pending[:end])
+            self.pending = self.pending[end:]
+
+    def finish(self, prompt: str = ''):
+
+        # Command complete (or failed): pass on what is left, without the prompt at the end:
+        text = self.pending
+        self.pending = ''
+        if not self.started:
+            first, _, rest = text.partition('\n')
+            text = rest if first.replace('\r', '') == self.command else text
+        if prompt != '' and text.endswith(prompt):
+            text = text[:-len(prompt)]
+        if text.endswith('\n'):
+            text = text[:-1]
+        self.emit(text)
+
+    def emit(self, text: str):
+
+        # Check output for known errors (lines are passed on whole, so each chunk can be checked on its own):
+        if self.error is None:
+            for error_re in self.known_errors:
+                tmp = re.search(error_re, text, re.MULTILINE)
+                if tmp:
+                    self.error = tmp.group(1).strip().capitalize()
+                    break
+
+        # Pass it on, line endings normalised:
+        text = text.replace('\r', '')
+        if text != '':
+            self.sink(text)
+
+
+def wait_for_data(channel, timeout):
+
+    """
+
+        Blocks until the channel has data to read, has been closed (or received EOF), or until 'timeout' seconds have
+          passed. Paramiko channels expose a file descriptor which becomes readable when data arrives or the channel
+          closes, so waiting costs no CPU.
+
+    :param channel: Paramiko channel (or any object offering 'recv_ready', 'closed' and 'fileno')
+    :param timeout: Maximum number of seconds to wait
+    :return: True if the channel is ready (data, EOF or closed), False if timed out
+    """
+
+    if channel.recv_ready() or channel.closed or getattr(channel, 'eof_received', False):
+        return True
+
+    timeout = max(timeout, 0)
+    try:
+        ready, _, _ = select.select([channel], [], [], timeout)
+    except (ValueError, OSError, TypeError, AttributeError):
+
+        # Channel has no usable file descriptor (e.g.: closed while waiting), fall back to a short sleep:
+        time.sleep(min(timeout, 0.01))
+        return channel.recv_ready() or channel.closed
+
+    return len(ready) > 0
+
+
+async def async_wait_for_data(channel, timeout):
+
+    """
+
+        Asynchronous version of 'wait_for_data': waits (without blocking the event loop) until the channel has data
+          to read, has been closed (or received EOF), or until 'timeout' seconds have passed.
+
+    :param channel: Paramiko channel
+    :param timeout: Maximum number of seconds to wait
+    :return: True if the channel is ready (data, EOF or closed), False if timed out
+    """
+
+    if channel.recv_ready() or channel.closed or getattr(channel, 'eof_received', False):
+        return True
+
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    fd = channel.fileno()
+    loop.add_reader(fd, lambda: ready.done() or ready.set_result(True))
+    try:
+        return await asyncio.wait_for(ready, max(timeout, 0))
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        loop.remove_reader(fd)
+
+
+# AXTC escape codes:
+AXTC_REGEX = r'\x1B(?:[@-Z\\-_][0-9];~\x07|\[[0-?]*[ -/]*[@-~])'
+AXTC_ESCAPE = re.compile(AXTC_REGEX, flags=re.IGNORECASE)
+AXTC_ESCAPE_BYTES = re.compile(AXTC_REGEX.encode(), flags=re.IGNORECASE)
+
+# Start of an escape code at the very end of a chunk (and the most bytes of one that are held back):
+AXTC_PARTIAL_BYTES = re.compile(rb'\x1B(?:[@-Z\\-_][0-9];?~?|\[[0-?]*[ -/]*)?\Z', flags=re.IGNORECASE)
+AXTC_MAX_PARTIAL = 64
@@ -1,6 +1,5 @@
 import re
 from pprint import pprint
-from ssh.lib.processors.write_to_sqlite3_db import sql
 
 
 def analyze(output, collection=None):
@@ -38,13 +37,8 @@ def analyze(output, collection=None):
     # Add an extra line so regex can catch the last interface!
     output += '\n'
 
-    syslog_msg_types = []
     search_str = re.compile(r'(.*?)\s+(%[A-Z].*?-\d+-.*?):\s(.*?)\n')
     for timestamp, log_type, info in re.findall(search_str, output):
-        if log_type not in syslog_msg_types:
-            syslog_msg_types.append(log_type)
-            sql_qry = "INSERT INTO syslog (msg_type, info) VALUES (?, ?)"
-            sql_vals = [log_type, info]
-            sql(sql_qry, tuple(sql_vals, ))
+        collection['log_messages'].append({'timestamp': timestamp.strip(), 'type': log_type, 'info': info})
 
     return True, collection